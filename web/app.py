@@ -3,14 +3,44 @@ from fastapi.requests import Request
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from router import init_router
-from database import init_db
+from database import async_engine, init_db
+from config import CONFIG
+from service.compute import compute_pool
+from service.jobs import job_queue
+from service.recycle.dem_cache import dem_registry
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 预加载 DEM，避免首个请求承担栅格读取开销
+    if CONFIG.DEM_PRELOAD:
+        try:
+            dem_registry.get(CONFIG.DEM_FILE_PATH, utm_epsg=CONFIG.UTM_EPSG)
+        except Exception as e:
+            print(f"预加载 DEM 失败，将在首次使用时加载: {str(e)}")
+
+    # 启动计算进程池，每个子进程按路径自行加载 DEM
+    compute_pool.start(
+        CONFIG.COMPUTE_WORKERS,
+        dem_file_path=CONFIG.DEM_FILE_PATH if CONFIG.DEM_PRELOAD else None,
+        utm_epsg=CONFIG.UTM_EPSG,
+    )
+
+    yield
+
+    # 关闭后台任务线程池和计算进程池
+    job_queue.shutdown()
+    compute_pool.shutdown()
+    # 关闭异步数据库连接池
+    await async_engine.dispose()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
 
     # 添加CORS中间件以允许跨域请求
     app.add_middleware(
@@ -19,6 +49,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],  # 允许所有HTTP方法
         allow_headers=["*"],  # 允许所有HTTP头
+        expose_headers=["X-Total-Count", "X-Next-After-Id"],  # 分页信息
     )
 
     init_db()
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import List
 
 from pydantic_settings import BaseSettings
 
@@ -9,6 +10,35 @@ class AppConfig(BaseSettings):
     LOG_PATH: Path = Path("./logs")
     APP_NAME: str = "相机位置计算"
     DATABASE_URI: str = "sqlite:///./test.db"  # 示例数据库URI
+    SQLITE_WAL: bool = True  # SQLite 使用 WAL 日志模式，读写互不阻塞
+    SQLITE_BUSY_TIMEOUT: int = 5000  # SQLite 等待写锁的超时时间（毫秒）
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # SQLite 内存映射读取的大小上限（字节）
+    DEM_FILE_PATH: Path = Path("./service/recycle/DEM1.tif")  # DEM 文件路径
+    DEM_PRELOAD: bool = True  # 启动时预加载 DEM 到缓存
+    UTM_EPSG: int | None = None  # UTM 分带 EPSG 代码，为空时根据 DEM 位置自动选择
+    EPNP_EXECUTOR: str = "thread"  # 相机参数搜索模式：serial / thread / process
+    EPNP_WORKERS: int = 4  # 相机参数搜索的并行数量
+    EPNP_REFINE_FOCAL: bool = True  # 网格搜索后对焦距做连续优化
+    COMPUTE_WORKERS: int | None = None  # 计算进程池大小，为空时使用 CPU 核数，为 0 时在线程池中计算
+    CAMERA_CONTEXT_CACHE_SIZE: int = 128  # 相机上下文缓存的最大条目数
+    CAMERA_CONTEXT_CACHE_BYTES: int = 64 * 1024 * 1024  # 相机上下文缓存的内存上限
+    WORLD_RASTER_ENABLED: bool = True  # 标定后生成像素→地理坐标查找栅格
+    WORLD_RASTER_STRIDE: int = 8  # 查找栅格的像素采样间隔
+    BUILDING_POINT_IMPORT_BATCH_SIZE: int = 1000  # 批量导入建筑点时每批的数量
+    MAX_UPLOAD_SIZE: int = 1024 * 1024 * 1024  # 单张图片上传大小上限（字节）
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 上传时每次写入磁盘的块大小
+    TILE_PYRAMID_ENABLED: bool = True  # 上传后生成瓦片金字塔
+    TILE_SIZE: int = 256  # 瓦片边长（像素）
+    TILE_OVERLAP: int = 1  # 相邻瓦片重叠的像素数
+    TILE_FORMAT: str = "jpeg"  # 瓦片格式：jpeg / webp
+    TILE_QUALITY: int = 85  # 瓦片压缩质量
+    TILE_CACHE_MAX_AGE: int = 86400  # 瓦片 HTTP 缓存时间（秒）
+    THUMBNAIL_SIZES: List[int] = [256, 1024]  # 缩略图/预览图最长边，第一个为默认尺寸
+    THUMBNAIL_QUALITY: int = 80  # 缩略图 JPEG 压缩质量
+    MAX_PAGE_SIZE: int = 1000  # 列表接口单页最大条数
+    SPATIAL_INDEX_REBUILD_THRESHOLD: int = 256  # 建筑点空间索引累计多少次变更后重建
+    JOB_WORKERS: int = 2  # 后台任务线程数量
+    JOB_HISTORY_SIZE: int = 1000  # 内存中保留的任务数量
 
     class Config:
         env_file = ".env"  # 指定 .env 文件路径
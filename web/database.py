@@ -1,7 +1,17 @@
-from sqlalchemy import create_engine
-from sqlalchemy.engine import Engine
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from pathlib import Path
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 
 from config import CONFIG
@@ -9,15 +19,80 @@ from config import CONFIG
 # 声明基类（用于模型继承）
 Base = declarative_base()
 
+
+# 各数据库后端对应的异步驱动
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def async_database_uri(uri: str) -> str:
+    """把同步数据库URI转换为使用异步驱动的URI，已是异步驱动时原样返回"""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"不支持异步访问的数据库: {backend}")
+    if url.get_driver_name() == ASYNC_DRIVERS[backend]:
+        return uri
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(
+        hide_password=False
+    )
+
+
+def engine_options(uri: str) -> dict:
+    """根据数据库后端选择连接池等引擎参数"""
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite":
+        options = {
+            # 连接会在线程池、后台任务线程之间传递
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": CONFIG.SQLITE_BUSY_TIMEOUT / 1000,
+            },
+            "echo": CONFIG.DEBUG,
+        }
+        # 文件数据库使用 SQLAlchemy 默认的 QueuePool，不需要 pre_ping 和连接回收
+        if url.database in (None, "", ":memory:"):
+            # 内存数据库只存在于单个连接中，所有线程共用同一个连接
+            options["poolclass"] = StaticPool
+        return options
+
+    return {
+        "pool_size": 10,  # 连接池初始大小
+        "max_overflow": 20,  # 连接池最大溢出连接数
+        "pool_timeout": 30,  # 连接池超时时间（秒）
+        "pool_recycle": 3600,  # 连接回收时间（秒，避免长连接问题）
+        "pool_pre_ping": True,  # 预检查连接有效性
+        "echo": CONFIG.DEBUG,  # 调试模式输出SQL日志
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """每个新的 SQLite 连接建立时设置 PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    try:
+        if CONFIG.SQLITE_WAL:
+            # WAL 模式下读不阻塞写、写不阻塞读；NORMAL 同步级别在 WAL 下仍保证不损坏数据库
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(CONFIG.SQLITE_BUSY_TIMEOUT)}")
+        cursor.execute(f"PRAGMA mmap_size={int(CONFIG.SQLITE_MMAP_SIZE)}")
+    finally:
+        cursor.close()
+
+
+def configure_engine(engine: Engine) -> Engine:
+    """为引擎注册数据库后端相关的连接事件"""
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
 # 创建同步数据库引擎
-engine: Engine = create_engine(
-    CONFIG.DATABASE_URI,
-    pool_size=10,  # 连接池初始大小
-    max_overflow=20,  # 连接池最大溢出连接数
-    pool_timeout=30,  # 连接池超时时间（秒）
-    pool_recycle=3600,  # 连接回收时间（秒，避免长连接问题）
-    pool_pre_ping=True,  # 预检查连接有效性
-    echo=CONFIG.DEBUG,  # 调试模式输出SQL日志
+engine: Engine = configure_engine(
+    create_engine(CONFIG.DATABASE_URI, **engine_options(CONFIG.DATABASE_URI))
 )
 
 # 创建会话工厂（用于生成数据库会话）
@@ -28,7 +103,21 @@ SessionLocal = sessionmaker(
 )
 
 
-# 依赖函数：获取数据库会话（常用于FastAPI路由）
+# 创建异步数据库引擎，供路由使用；后台任务线程和迁移仍使用同步引擎
+async_engine: AsyncEngine = create_async_engine(
+    async_database_uri(CONFIG.DATABASE_URI), **engine_options(CONFIG.DATABASE_URI)
+)
+configure_engine(async_engine.sync_engine)
+
+# 创建异步会话工厂，提交后不过期对象，避免在异步代码中隐式触发查询
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+# 依赖函数：获取数据库会话（用于后台任务等同步代码）
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
     try:
@@ -37,8 +126,23 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+# 依赖函数：获取异步数据库会话（用于FastAPI路由）
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def upgrade_db():
+    """执行 Alembic 迁移，将已有数据库升级到最新结构"""
+    alembic_config = AlembicConfig(str(Path(__file__).parent / "alembic.ini"))
+    with engine.begin() as connection:
+        alembic_config.attributes["connection"] = connection
+        command.upgrade(alembic_config, "head")
+
+
 # 创建所有表结构（建议在应用启动时执行一次）
 def init_db():
     """初始化数据库"""
     Base.metadata.create_all(bind=engine)
+    upgrade_db()
     print("Database initialized successfully.")
@@ -2,7 +2,9 @@ from uvicorn import run
 from config import CONFIG
 from app import create_app
 
-app = create_app()
+# 计算进程池以 spawn 方式启动子进程时会重新导入本模块（__mp_main__），此时不创建应用
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     if CONFIG.DEBUG:
@@ -0,0 +1,69 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+
+from config import CONFIG
+from database import Base
+
+# 导入所有模型，使 Base.metadata 包含全部表
+import model.building_point  # noqa: F401
+import model.camera_param  # noqa: F401
+import model.feature  # noqa: F401
+import model.images  # noqa: F401
+
+config = context.config
+
+# 由应用内部调用时不覆盖应用的日志配置
+if config.config_file_name is not None and not config.attributes.get("connection"):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """生成 SQL 脚本，不连接数据库"""
+    context.configure(
+        url=CONFIG.DATABASE_URI,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """连接数据库执行迁移，优先使用应用传入的连接"""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run_migrations(connection)
+        return
+
+    connectable = engine_from_config(
+        {"sqlalchemy.url": CONFIG.DATABASE_URI},
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+    with connectable.connect() as connection:
+        _run_migrations(connection)
+
+
+def _run_migrations(connection) -> None:
+    # SQLite 不支持大部分 ALTER TABLE，使用批量模式重建表
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
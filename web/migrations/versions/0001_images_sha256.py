@@ -0,0 +1,35 @@
+"""images 表增加 sha256 列，用于上传去重
+
+Revision ID: 0001_images_sha256
+Revises:
+Create Date: 2026-10-17 10:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0001_images_sha256"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 新数据库由 create_all 建表时已包含该列
+    inspector = sa.inspect(op.get_bind())
+    if "sha256" in {column["name"] for column in inspector.get_columns("images")}:
+        return
+
+    with op.batch_alter_table("images") as batch_op:
+        batch_op.add_column(sa.Column("sha256", sa.String(64), nullable=True))
+        batch_op.create_index("ix_images_sha256", ["sha256"], unique=True)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("images") as batch_op:
+        batch_op.drop_index("ix_images_sha256")
+        batch_op.drop_column("sha256")
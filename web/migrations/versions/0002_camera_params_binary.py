@@ -0,0 +1,98 @@
+"""camera_params 的数组列由 JSON 改为紧凑二进制
+
+Revision ID: 0002_camera_params_binary
+Revises: 0001_images_sha256
+Create Date: 2026-10-17 14:00:00
+
+"""
+
+import json
+
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+from model.types import decode_array, encode_array
+
+
+revision: str = "0002_camera_params_binary"
+down_revision: Union[str, Sequence[str], None] = "0001_images_sha256"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 列名 -> 是否允许为空
+ARRAY_COLUMNS = {
+    "camera_matrix": False,
+    "rotation_matrix": True,
+    "dist_coeffs": True,
+    "optimized_rotation_vector": True,
+    "optimized_translation_vector": True,
+}
+
+
+def _column_types() -> dict:
+    inspector = sa.inspect(op.get_bind())
+    return {
+        column["name"]: column["type"]
+        for column in inspector.get_columns("camera_params")
+    }
+
+
+def _convert(old_type, new_type, convert_value) -> None:
+    """新增临时列、逐行转换数据，再用临时列替换原列"""
+    with op.batch_alter_table("camera_params") as batch_op:
+        for name in ARRAY_COLUMNS:
+            batch_op.add_column(sa.Column(f"{name}_new", new_type, nullable=True))
+
+    bind = op.get_bind()
+    old_table = sa.table(
+        "camera_params",
+        sa.column("id", sa.Integer),
+        *[sa.column(name, old_type) for name in ARRAY_COLUMNS],
+    )
+    new_table = sa.table(
+        "camera_params",
+        sa.column("id", sa.Integer),
+        *[sa.column(f"{name}_new", new_type) for name in ARRAY_COLUMNS],
+    )
+    for row in bind.execute(sa.select(old_table)).mappings().all():
+        values = {
+            f"{name}_new": convert_value(row[name])
+            for name in ARRAY_COLUMNS
+            if row[name] is not None
+        }
+        if values:
+            bind.execute(
+                new_table.update().where(new_table.c.id == row["id"]).values(values)
+            )
+
+    with op.batch_alter_table("camera_params") as batch_op:
+        for name, nullable in ARRAY_COLUMNS.items():
+            batch_op.drop_column(name)
+            batch_op.alter_column(
+                f"{name}_new", new_column_name=name, nullable=nullable
+            )
+
+
+def _json_to_binary(value) -> bytes:
+    if isinstance(value, str):
+        value = json.loads(value)
+    return encode_array(np.array(value["data"], dtype=np.float64))
+
+
+def _binary_to_json(value) -> dict:
+    array = decode_array(bytes(value))
+    return {"data": array.tolist(), "shape": array.shape, "dtype": str(array.dtype)}
+
+
+def upgrade() -> None:
+    # 新数据库由 create_all 建表时已是二进制列
+    if isinstance(_column_types()["camera_matrix"], sa.LargeBinary):
+        return
+    _convert(sa.JSON, sa.LargeBinary, _json_to_binary)
+
+
+def downgrade() -> None:
+    _convert(sa.LargeBinary, sa.JSON, _binary_to_json)
@@ -0,0 +1,129 @@
+"""images 表的相机位置由字符串改为结构化的数值列
+
+Revision ID: 0003_images_camera_location
+Revises: 0002_camera_params_binary
+Create Date: 2026-10-17 16:00:00
+
+"""
+
+import ast
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from config import CONFIG
+from service.recycle.geo_transformer import get_geo_transformer, utm_epsg_for
+
+revision: str = "0003_images_camera_location"
+down_revision: Union[str, Sequence[str], None] = "0002_camera_params_binary"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FLOAT_COLUMNS = (
+    "camera_lon",
+    "camera_lat",
+    "camera_height",
+    "camera_easting",
+    "camera_northing",
+)
+
+images = sa.table(
+    "images",
+    sa.column("id", sa.Integer),
+    sa.column("calculated_camera_locations", sa.String),
+    *[sa.column(name, sa.Float) for name in FLOAT_COLUMNS],
+    sa.column("camera_utm_epsg", sa.Integer),
+)
+
+
+def _columns() -> set:
+    inspector = sa.inspect(op.get_bind())
+    return {column["name"] for column in inspector.get_columns("images")}
+
+
+def _indexes() -> set:
+    inspector = sa.inspect(op.get_bind())
+    return {index["name"] for index in inspector.get_indexes("images")}
+
+
+def upgrade() -> None:
+    # 新数据库由 create_all 建表时已是新的列
+    if "calculated_camera_locations" not in _columns():
+        return
+
+    with op.batch_alter_table("images") as batch_op:
+        for name in FLOAT_COLUMNS:
+            batch_op.add_column(sa.Column(name, sa.Float, nullable=True))
+        batch_op.add_column(sa.Column("camera_utm_epsg", sa.Integer, nullable=True))
+
+    # 旧数据为 str((lon, lat, height))，numpy 2 下可能写成 np.float64(...) 的形式；
+    # UTM 分带与标定时一致：未配置时按相机位置选择
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(images.c.id, images.c.calculated_camera_locations).where(
+            images.c.calculated_camera_locations.isnot(None)
+        )
+    ).all()
+    for image_id, location in rows:
+        try:
+            lon, lat, height = (
+                float(v) for v in ast.literal_eval(location.replace("np.float64", ""))
+            )
+        except (ValueError, SyntaxError, TypeError):
+            continue
+        utm_epsg = CONFIG.UTM_EPSG or utm_epsg_for(lon, lat)
+        easting, northing = get_geo_transformer(utm_epsg).wgs84_to_utm(lon, lat)
+        bind.execute(
+            images.update()
+            .where(images.c.id == image_id)
+            .values(
+                camera_lon=lon,
+                camera_lat=lat,
+                camera_height=height,
+                camera_easting=float(easting),
+                camera_northing=float(northing),
+                camera_utm_epsg=utm_epsg,
+            )
+        )
+
+    old_indexes = _indexes()
+    with op.batch_alter_table("images") as batch_op:
+        if "ix_images_calculated_camera_locations" in old_indexes:
+            batch_op.drop_index("ix_images_calculated_camera_locations")
+        batch_op.drop_column("calculated_camera_locations")
+        batch_op.create_index(
+            "ix_images_camera_lon_lat", ["camera_lon", "camera_lat"], unique=False
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("images") as batch_op:
+        batch_op.add_column(
+            sa.Column("calculated_camera_locations", sa.String, nullable=True)
+        )
+        batch_op.create_index(
+            "ix_images_calculated_camera_locations", ["calculated_camera_locations"]
+        )
+
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(
+            images.c.id,
+            images.c.camera_lon,
+            images.c.camera_lat,
+            images.c.camera_height,
+        ).where(images.c.camera_lon.isnot(None))
+    ).all()
+    for image_id, lon, lat, height in rows:
+        bind.execute(
+            images.update()
+            .where(images.c.id == image_id)
+            .values(calculated_camera_locations=str((lon, lat, height)))
+        )
+
+    with op.batch_alter_table("images") as batch_op:
+        batch_op.drop_index("ix_images_camera_lon_lat")
+        for name in (*FLOAT_COLUMNS, "camera_utm_epsg"):
+            batch_op.drop_column(name)
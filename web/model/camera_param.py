@@ -1,13 +1,15 @@
-from sqlalchemy import Integer, ForeignKey, Float, JSON
+from sqlalchemy import Integer, ForeignKey, Float
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
+import numpy as np
 
 if TYPE_CHECKING:
     from model.images import Images
 
 from database import Base
+from model.types import NumpyArray
 
 
 class CameraParam(Base):
@@ -24,17 +26,23 @@ class CameraParam(Base):
     sensor_height: Mapped[float] = mapped_column(Float, nullable=False)
     reprojection_error: Mapped[float] = mapped_column(Float, nullable=False)
 
-    # 相机内参矩阵K，使用JSON类型存储numpy数组
-    camera_matrix: Mapped[dict] = mapped_column(JSON, nullable=False)
+    # 相机内参矩阵K，以二进制形式存储numpy数组
+    camera_matrix: Mapped[np.ndarray] = mapped_column(NumpyArray, nullable=False)
 
-    # 旋转矩阵R，使用JSON类型存储numpy数组
-    rotation_matrix: Mapped[dict] = mapped_column(JSON, nullable=True)
+    # 旋转矩阵R，以二进制形式存储numpy数组
+    rotation_matrix: Mapped[Optional[np.ndarray]] = mapped_column(
+        NumpyArray, nullable=True
+    )
 
-    # 畸变系数，使用JSON类型存储numpy数组
-    dist_coeffs: Mapped[dict] = mapped_column(JSON, nullable=True)
+    # 畸变系数，以二进制形式存储numpy数组
+    dist_coeffs: Mapped[Optional[np.ndarray]] = mapped_column(NumpyArray, nullable=True)
 
-    # 优化后的旋转向量，使用JSON类型存储numpy数组
-    optimized_rotation_vector: Mapped[dict] = mapped_column(JSON, nullable=True)
+    # 优化后的旋转向量，以二进制形式存储numpy数组
+    optimized_rotation_vector: Mapped[Optional[np.ndarray]] = mapped_column(
+        NumpyArray, nullable=True
+    )
 
-    # 优化后的平移向量，使用JSON类型存储numpy数组
-    optimized_translation_vector: Mapped[dict] = mapped_column(JSON, nullable=True)
+    # 优化后的平移向量，以二进制形式存储numpy数组
+    optimized_translation_vector: Mapped[Optional[np.ndarray]] = mapped_column(
+        NumpyArray, nullable=True
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, Tuple as DBTuple, Float as DBFloat
+from sqlalchemy import Index, Integer, String, Tuple as DBTuple, Float as DBFloat
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from typing import TYPE_CHECKING
@@ -17,11 +17,22 @@ class Images(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String, index=True)
     path: Mapped[str] = mapped_column(String, index=True)
+    # 图片内容的 SHA-256，用于上传去重
+    sha256: Mapped[Optional[str]] = mapped_column(
+        String(64), index=True, unique=True, nullable=True
+    )
     camera_params: Mapped[list["CameraParam"]] = relationship(
         "CameraParam", back_populates="image"
     )
 
     features: Mapped[list["Feature"]] = relationship("Feature", back_populates="image")
-    calculated_camera_locations: Mapped[Optional[str]] = mapped_column(
-        String, index=True
-    )
+
+    # 标定得到的相机位置（WGS84 经纬度和高程），以及其在 camera_utm_epsg 分带下的 UTM 坐标
+    camera_lon: Mapped[Optional[float]] = mapped_column(DBFloat, nullable=True)
+    camera_lat: Mapped[Optional[float]] = mapped_column(DBFloat, nullable=True)
+    camera_height: Mapped[Optional[float]] = mapped_column(DBFloat, nullable=True)
+    camera_easting: Mapped[Optional[float]] = mapped_column(DBFloat, nullable=True)
+    camera_northing: Mapped[Optional[float]] = mapped_column(DBFloat, nullable=True)
+    camera_utm_epsg: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    __table_args__ = (Index("ix_images_camera_lon_lat", "camera_lon", "camera_lat"),)
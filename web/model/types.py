@@ -0,0 +1,39 @@
+import struct
+
+import numpy as np
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+# 二进制格式：1 字节维数 + 每维 4 字节长度（小端）+ 小端 float64 数据
+ARRAY_DTYPE = np.dtype("<f8")
+
+
+def encode_array(value) -> bytes:
+    """把数组编码为带形状头的小端 float64 字节串"""
+    array = np.ascontiguousarray(value, dtype=ARRAY_DTYPE)
+    header = struct.pack(f"<B{array.ndim}I", array.ndim, *array.shape)
+    return header + array.tobytes()
+
+
+def decode_array(data: bytes) -> np.ndarray:
+    """从字节串解码数组，数据部分直接引用原字节串，不做拷贝（结果只读）"""
+    ndim = data[0]
+    shape = struct.unpack_from(f"<{ndim}I", data, 1)
+    return np.frombuffer(data, dtype=ARRAY_DTYPE, offset=1 + 4 * ndim).reshape(shape)
+
+
+class NumpyArray(TypeDecorator):
+    """以紧凑二进制形式存储 float64 numpy 数组的列类型"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode_array(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decode_array(bytes(value))
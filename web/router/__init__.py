@@ -3,6 +3,7 @@ from .images import api as images_api
 from .features import api as features_api
 from .building_points import api as building_points_api
 from .camera import api as camera_api
+from .jobs import api as jobs_api
 
 
 def init_router(app: FastAPI):
@@ -17,4 +18,5 @@ def init_router(app: FastAPI):
     app.include_router(features_api)
     app.include_router(building_points_api)
     app.include_router(camera_api)
+    app.include_router(jobs_api)
     return app
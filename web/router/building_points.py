@@ -1,15 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, File, Query, UploadFile
 from fastapi.requests import Request
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, delete, select
+from typing import List, Optional
 from fastapi.responses import JSONResponse
 
+from config import CONFIG
 from model.building_point import BuildingPoint as BuildingPointModels
 from model.feature import Feature as FeatureModel
 from schema.building_point import BuildingPoint
-from database import get_db
+from database import get_async_db
 from pydantic import BaseModel
+from service.pagination import keyset_page, page_headers
+from service.spatial_index import building_point_index, load_building_point_index
+from service.building_points import (
+    IMPORT_FORMATS,
+    detect_import_format,
+    import_building_points,
+    parse_building_points,
+)
 
 api = APIRouter(prefix="/api", tags=["building_points"])
 
@@ -24,39 +35,132 @@ class BuildingPointsUpload(BaseModel):
     points: List[BuildingPointData]
 
 
+def _parse_floats(value: str, count: int, name: str) -> List[float]:
+    """解析逗号分隔的坐标参数"""
+    try:
+        numbers = [float(v) for v in value.split(",")]
+    except ValueError:
+        numbers = []
+    # float() 接受 nan/inf，这里一并拒绝
+    if len(numbers) != count or not all(math.isfinite(v) for v in numbers):
+        raise HTTPException(
+            status_code=400, detail=f"{name} 参数应为 {count} 个逗号分隔的数字"
+        )
+    return numbers
+
+
+def _check_lonlat(longitude: float, latitude: float, name: str):
+    """检查经纬度范围"""
+    if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
+        raise HTTPException(
+            status_code=400,
+            detail=f"{name} 参数的经度应在 ±180 之间，纬度应在 ±90 之间",
+        )
+
+
+async def _spatial_query(
+    bbox: str | None,
+    near: str | None,
+    radius: float | None,
+    limit: int | None,
+    q: str | None,
+) -> JSONResponse:
+    """使用空间索引按外包框或距离查询建筑点"""
+    if bbox and near:
+        raise HTTPException(status_code=400, detail="bbox 和 near 参数不能同时使用")
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = _parse_floats(bbox, 4, "bbox")
+        _check_lonlat(min_lon, min_lat, "bbox")
+        _check_lonlat(max_lon, max_lat, "bbox")
+        await load_building_point_index()
+        results = building_point_index.within_bbox(min_lon, min_lat, max_lon, max_lat)
+    else:
+        if radius is None:
+            raise HTTPException(
+                status_code=400, detail="near 参数需要同时提供 radius（米）"
+            )
+        if not math.isfinite(radius) or radius <= 0:
+            raise HTTPException(status_code=400, detail="radius 参数应为正的有限数字")
+        lon, lat = _parse_floats(near, 2, "near")
+        _check_lonlat(lon, lat, "near")
+        await load_building_point_index()
+        results = building_point_index.near(lon, lat, radius)
+
+    if q:
+        results = [row for row in results if row["name"].startswith(q)]
+    total = len(results)
+    if limit is not None:
+        results = results[:limit]
+    return JSONResponse(content=results, headers={"X-Total-Count": str(total)})
+
+
 @api.get("/building_points")
-async def get_building_points(db: Session = Depends(get_db)):
-    """获取所有建筑点数据"""
+async def get_building_points(
+    after_id: int | None = None,
+    limit: int | None = Query(None, ge=1, le=CONFIG.MAX_PAGE_SIZE),
+    q: str | None = None,
+    bbox: str | None = None,
+    near: str | None = None,
+    radius: float | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    获取建筑点数据
+    支持按 id 键集分页（after_id、limit）和名称前缀搜索（q），
+    总数和下一页游标通过 X-Total-Count、X-Next-After-Id 响应头返回。
+    bbox=最小经度,最小纬度,最大经度,最大纬度 按外包框查询（按 id 排序）；
+    near=经度,纬度&radius=米 按距离查询（按距离排序，附带 distance 字段）。
+    """
+    if bbox or near:
+        return await _spatial_query(bbox, near, radius, limit, q)
+
     try:
-        building_points = db.query(BuildingPointModels).all()
-        return [
-            {
-                "id": bp.id,
-                "name": bp.name,
-                "latitude": bp.latitude,
-                "longitude": bp.longitude,
-            }
-            for bp in building_points
-        ]
+        # 只查询需要的列，避免构造 ORM 对象
+        building_points, total = await keyset_page(
+            db,
+            select(
+                BuildingPointModels.id,
+                BuildingPointModels.name,
+                BuildingPointModels.latitude,
+                BuildingPointModels.longitude,
+            ),
+            BuildingPointModels.id,
+            BuildingPointModels.name,
+            after_id,
+            limit,
+            q,
+        )
+        return JSONResponse(
+            content=[
+                {
+                    "id": bp.id,
+                    "name": bp.name,
+                    "latitude": bp.latitude,
+                    "longitude": bp.longitude,
+                }
+                for bp in building_points
+            ],
+            headers=page_headers(building_points, total, limit),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @api.post("/upload_building_point")
 async def upload_building_point(
-    request: Request, building_point: BuildingPoint, db: Session = Depends(get_db)
+    request: Request,
+    building_point: BuildingPoint,
+    db: AsyncSession = Depends(get_async_db),
 ):
     # 检查是否已存在具有相同名称、经纬度的建筑点
-    existing_building_point = (
-        db.query(BuildingPointModels)
-        .filter(
+    existing_building_point = await db.scalar(
+        select(BuildingPointModels).where(
             and_(
                 BuildingPointModels.name == building_point.name,
                 BuildingPointModels.longitude == building_point.longitude,
                 BuildingPointModels.latitude == building_point.latitude,
             )
         )
-        .first()
     )
 
     if existing_building_point:
@@ -67,79 +171,106 @@ async def upload_building_point(
         latitude=building_point.latitude,
         longitude=building_point.longitude,
     )
-    building_point_models.features = []
     db.add(building_point_models)
-    db.commit()
+    await db.commit()
+    building_point_index.upsert(
+        building_point_models.id,
+        building_point_models.name,
+        building_point_models.longitude,
+        building_point_models.latitude,
+    )
     return {"status": "success", "message": "建筑点创建成功"}
 
 
 @api.post("/upload_building_points")
 async def upload_building_points(
-    request: Request, data: BuildingPointsUpload, db: Session = Depends(get_db)
+    request: Request,
+    data: BuildingPointsUpload,
+    db: AsyncSession = Depends(get_async_db),
 ):
     try:
-        created_count = 0
-        existing_count = 0
-
-        for point_data in data.points:
-            # 检查是否已存在具有相同名称、经纬度的建筑点
-            existing_building_point = (
-                db.query(BuildingPointModels)
-                .filter(
-                    and_(
-                        BuildingPointModels.name == point_data.name,
-                        BuildingPointModels.longitude == point_data.longitude,
-                        BuildingPointModels.latitude == point_data.latitude,
-                    )
-                )
-                .first()
-            )
-
-            if existing_building_point:
-                existing_count += 1
-            else:
-                # 创建新的建筑点
-                new_building_point = BuildingPointModels(
-                    name=point_data.name,
-                    longitude=point_data.longitude,
-                    latitude=point_data.latitude,
-                )
-                db.add(new_building_point)
-                created_count += 1
-
-        db.commit()
+        created_count, existing_count = await db.run_sync(
+            import_building_points,
+            [(p.name, p.longitude, p.latitude) for p in data.points],
+            batch_size=CONFIG.BUILDING_POINT_IMPORT_BATCH_SIZE,
+        )
+        if created_count:
+            building_point_index.invalidate()
 
         return JSONResponse(
             content={
-                "message": f"成功上传 {created_count} 个新建筑点，{existing_count} 个建筑点已存在"
+                "message": f"成功上传 {created_count} 个新建筑点，{existing_count} 个建筑点已存在",
+                "created": created_count,
+                "existing": existing_count,
             }
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"上传建筑点时发生错误: {str(e)}")
 
 
+@api.post("/building_points/import")
+async def import_building_points_file(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    从 JSON / CSV / GeoJSON 文件批量导入建筑点
+    未指定 format 时根据文件扩展名判断格式
+    """
+    file_format = (
+        format or detect_import_format(file.filename, file.content_type)
+    ).lower()
+    if file_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的文件格式: {file_format}")
+
+    try:
+        points = parse_building_points(await file.read(), file_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        created_count, existing_count = await db.run_sync(
+            import_building_points,
+            points,
+            batch_size=CONFIG.BUILDING_POINT_IMPORT_BATCH_SIZE,
+        )
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"导入建筑点时发生错误: {str(e)}")
+    if created_count:
+        building_point_index.invalidate()
+
+    return JSONResponse(
+        content={
+            "status": "success",
+            "message": f"成功导入 {created_count} 个新建筑点，{existing_count} 个建筑点已存在",
+            "total": len(points),
+            "created": created_count,
+            "existing": existing_count,
+        }
+    )
+
+
 @api.put("/building_points/{point_id}")
 async def update_building_point(
-    point_id: int, building_point: BuildingPoint, db: Session = Depends(get_db)
+    point_id: int,
+    building_point: BuildingPoint,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     更新建筑点信息
     """
     try:
         # 检查建筑点是否存在
-        existing_point = (
-            db.query(BuildingPointModels)
-            .filter(BuildingPointModels.id == point_id)
-            .first()
-        )
+        existing_point = await db.get(BuildingPointModels, point_id)
         if not existing_point:
             raise HTTPException(status_code=404, detail="建筑点不存在")
 
         # 检查是否已存在具有相同名称、经纬度的建筑点
-        duplicate_point = (
-            db.query(BuildingPointModels)
-            .filter(
+        duplicate_point = await db.scalar(
+            select(BuildingPointModels).where(
                 and_(
                     BuildingPointModels.name == building_point.name,
                     BuildingPointModels.longitude == building_point.longitude,
@@ -147,7 +278,6 @@ async def update_building_point(
                     BuildingPointModels.id != point_id,
                 )
             )
-            .first()
         )
 
         if duplicate_point:
@@ -160,8 +290,13 @@ async def update_building_point(
         existing_point.latitude = building_point.latitude
         existing_point.longitude = building_point.longitude
 
-        db.commit()
-        db.refresh(existing_point)
+        await db.commit()
+        building_point_index.upsert(
+            existing_point.id,
+            existing_point.name,
+            existing_point.longitude,
+            existing_point.latitude,
+        )
 
         return JSONResponse(
             content={
@@ -178,37 +313,36 @@ async def update_building_point(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"更新建筑点时发生错误: {str(e)}")
 
 
 @api.delete("/building_points/{point_id}")
-async def delete_building_point(point_id: int, db: Session = Depends(get_db)):
+async def delete_building_point(
+    point_id: int, db: AsyncSession = Depends(get_async_db)
+):
     """
     删除建筑点及其相关特征点
     """
     try:
         # 检查建筑点是否存在
-        existing_point = (
-            db.query(BuildingPointModels)
-            .filter(BuildingPointModels.id == point_id)
-            .first()
-        )
+        existing_point = await db.get(BuildingPointModels, point_id)
         if not existing_point:
             raise HTTPException(status_code=404, detail="建筑点不存在")
 
         # 删除与该建筑点相关的所有特征点
-        db.query(FeatureModel).filter(
-            FeatureModel.building_point_id == point_id
-        ).delete()
+        await db.execute(
+            delete(FeatureModel).where(FeatureModel.building_point_id == point_id)
+        )
 
         # 删除建筑点
-        db.delete(existing_point)
-        db.commit()
+        await db.delete(existing_point)
+        await db.commit()
+        building_point_index.remove(point_id)
 
         return JSONResponse(content={"status": "success", "message": "建筑点删除成功"})
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"删除建筑点时发生错误: {str(e)}")
@@ -1,21 +1,40 @@
-from typing import List, Tuple
-from fastapi import APIRouter, Depends, HTTPException, Form, Body
-from sqlalchemy.orm import Session
-from fastapi.responses import JSONResponse
+from typing import List, Literal, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Form, Body, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.requests import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import FileResponse, JSONResponse
 import numpy as np
+import json
 
-from model.images import Images as ImagesModel
-from model.camera_param import CameraParam
-from database import get_db
-from pydantic import BaseModel
-from service.recycle.main import reprojection_point
-from service.recycle.utils import (
-    load_dem_data,
-    load_features_from_orm,
-    load_points_data_from_orm,
-    pixel_to_geo,
-    geo_transformer,
-    get_dem_elevation,
+from database import get_async_db
+from config import CONFIG
+from pydantic import BaseModel, ValidationError
+from service.recycle.dem_cache import dem_registry
+from service.camera_context import (
+    CameraContext,
+    CameraContextError,
+    camera_context_cache,
+    get_camera_context_async,
+)
+from service.boundaries import (
+    BoundaryAnnotation,
+    load_boundaries,
+    save_boundaries,
+)
+from service.terrain_mesh import (
+    MAX_DECIMATION,
+    MESH_FORMATS,
+    remove_terrain_meshes,
+)
+from service.world_raster import lookup_world_raster
+from service.recycle.geo_transformer import get_geo_transformer
+from service.compute import (
+    compute_pool,
+    geo_to_pixel,
+    georeference,
+    pixels_to_geo,
+    terrain_mesh,
 )
 
 api = APIRouter(prefix="/api", tags=["camera"])
@@ -26,103 +45,246 @@ class Position(BaseModel):
     latitude: float
 
 
+async def _get_dem():
+    """获取 DEM；文件更新后的重新加载较慢，放到线程池中执行，不阻塞事件循环"""
+    return await run_in_threadpool(
+        dem_registry.get, CONFIG.DEM_FILE_PATH, utm_epsg=CONFIG.UTM_EPSG
+    )
+
+
+async def _load_camera_context(image_id: int, db: AsyncSession, dem) -> CameraContext:
+    """加载图片的相机上下文，失败时转换为HTTP错误"""
+    try:
+        return await get_camera_context_async(image_id, db, dem)
+    except CameraContextError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+def _require_control_points(context: CameraContext):
+    """像素转地理坐标需要控制点的优化因子，没有可用控制点时返回400"""
+    if len(context.control_pixels) == 0:
+        raise HTTPException(status_code=400, detail="图片没有可用的控制点")
+
+
+def _echo_pixel(pixel_x: float, pixel_y: float) -> List[float | None]:
+    """原样返回提交的像素坐标，JSON 无法表示的 NaN/inf 分量写为 null"""
+    return [value if np.isfinite(value) else None for value in (pixel_x, pixel_y)]
+
+
+async def _pixels_to_geo(context: CameraContext, pixels: np.ndarray) -> np.ndarray:
+    """使用相机上下文在计算进程池中批量计算像素对应的UTM交点"""
+    return await compute_pool.run(
+        pixels_to_geo, context, pixels, CONFIG.DEM_FILE_PATH, CONFIG.UTM_EPSG
+    )
+
+
 @api.post("/calculate_geo_to_pixel/{image_id}")
 async def get_calculate_geo_to_pixel(
     image_id: int,
     points_position: List[Position] = Body(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    image = db.query(ImagesModel).filter(ImagesModel.id == image_id).first()
-    if not image:
-        raise HTTPException(status_code=404, detail="图片未找到")
+    dem = await _get_dem()
+    context = await _load_camera_context(image_id, db, dem)
 
-    camera_param = (
-        db.query(CameraParam).filter(CameraParam.image_id == image_id).first()
-    )
-    if not camera_param:
-        raise HTTPException(status_code=404, detail="相机参数未找到")
-
-    dem = load_dem_data(dem_file_path="./service/recycle/DEM1.tif")
-
-    points = load_points_data_from_orm(load_features_from_orm(image_id, db), dem)
-    if not points:
-        raise HTTPException(status_code=400, detail="图片没有特征点")
-
-    point_highs = [
-        get_dem_elevation(
-            dem,
-            [position.longitude, position.latitude],
-            coord_type="wgs84",
-        )
-        for position in points_position
-    ]
-    position = [
-        geo_transformer.wgs84_to_utm(position.longitude, position.latitude)
-        for position in points_position
-    ]
-    pos3d = np.array(
-        [
-            [easting, northing, high]
-            for (easting, northing), high in zip(position, point_highs)
-        ],
+    lonlat = np.array(
+        [[position.longitude, position.latitude] for position in points_position],
         dtype=np.float64,
-    ).reshape(-1, 3)
-
-    pixels = reprojection_point(
-        pos3d,
-        np.array(camera_param.camera_matrix["data"], dtype=np.float64),
-        np.array(camera_param.dist_coeffs["data"], dtype=np.float64),
-        np.array(camera_param.optimized_rotation_vector["data"], dtype=np.float64),
-        np.array(camera_param.optimized_translation_vector["data"], dtype=np.float64),
+    ).reshape(-1, 2)
+    pixels = await compute_pool.run(
+        geo_to_pixel, context, lonlat, CONFIG.DEM_FILE_PATH, CONFIG.UTM_EPSG
     )
+    if pixels is None:
+        raise HTTPException(status_code=400, detail="坐标超出DEM范围")
 
     return JSONResponse(content={"status": "success", "pixel": pixels})
 
 
 @api.post("/calculate_pixel_to_geo/{image_id}")
 async def get_calculate_pixel_to_geo(
-    image_id: int, pixels: Tuple[float, float], db: Session = Depends(get_db)
+    image_id: int, pixels: Tuple[float, float], db: AsyncSession = Depends(get_async_db)
 ):
-    image = db.query(ImagesModel).filter(ImagesModel.id == image_id).first()
-    if not image:
-        raise HTTPException(status_code=404, detail="图片未找到")
+    dem = await _get_dem()
+    context = await _load_camera_context(image_id, db, dem)
+    _require_control_points(context)
+
+    pixel = np.array([pixels], dtype=np.float64)
 
-    camera_param = (
-        db.query(CameraParam).filter(CameraParam.image_id == image_id).first()
+    # 优先使用预先计算的查找栅格，不可用时再做射线求交
+    geo_point = None
+    world_points = lookup_world_raster(context, pixel)
+    if world_points is not None and not np.isnan(world_points[0, 0]):
+        geo_point = world_points[0]
+    if geo_point is None:
+        geo_point = (await _pixels_to_geo(context, pixel))[0]
+    if np.isnan(geo_point[0]):
+        raise HTTPException(status_code=400, detail="未找到像素对应的地理坐标")
+    geo_point = get_geo_transformer(dem.utm_epsg).utm_to_wgs84(
+        float(geo_point[0]), float(geo_point[1])
     )
-    if not camera_param:
-        raise HTTPException(status_code=404, detail="相机参数未找到")
 
-    dem = load_dem_data(dem_file_path="./service/recycle/DEM1.tif")
+    return JSONResponse(content={"status": "success", "geo": geo_point})
+
+
+class PixelBatch(BaseModel):
+    pixels: List[Tuple[float, float]]
+
+
+async def _read_pixel_batch(request: Request) -> np.ndarray:
+    """读取批量像素坐标，支持 JSON 或按 (x, y) 排列的 little-endian float32 二进制数据"""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("application/octet-stream"):
+        if len(body) % 8 != 0:
+            raise HTTPException(
+                status_code=400, detail="二进制数据长度必须是 8 字节的整数倍"
+            )
+        return np.frombuffer(body, dtype="<f4").reshape(-1, 2).astype(np.float64)
+
+    try:
+        payload = json.loads(body)
+        if isinstance(payload, list):
+            payload = {"pixels": payload}
+        batch = PixelBatch.model_validate(payload)
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=f"像素坐标格式错误: {str(e)}")
+    return np.array(batch.pixels, dtype=np.float64).reshape(-1, 2)
+
 
-    points = load_points_data_from_orm(load_features_from_orm(image_id, db), dem)
-    if not points:
-        raise HTTPException(status_code=400, detail="图片没有特征点")
+@api.post("/images/{image_id}/pixels_to_geo")
+async def post_pixels_to_geo(
+    image_id: int, request: Request, db: AsyncSession = Depends(get_async_db)
+):
+    """批量将像素坐标转换为地理坐标"""
+    pixels = await _read_pixel_batch(request)
+    dem = await _get_dem()
+    context = await _load_camera_context(image_id, db, dem)
+    _require_control_points(context)
+
+    valid = np.isfinite(pixels).all(axis=1)
+    points = np.full((len(pixels), 3), np.nan)
+    if valid.any():
+        points[valid] = await _pixels_to_geo(context, pixels[valid])
+
+    hit = ~np.isnan(points[:, 0])
+    lon = np.full(len(pixels), np.nan)
+    lat = np.full(len(pixels), np.nan)
+    if hit.any():
+        lon[hit], lat[hit] = get_geo_transformer(dem.utm_epsg).utm_to_wgs84_array(
+            points[hit, 0], points[hit, 1]
+        )
 
-    control_points = [
-        {
-            "pixel": point.pixel,
-            "pos3d": point.pos3d,
-            "symbol": point.symbol,
+    results = []
+    for i, (pixel_x, pixel_y) in enumerate(pixels.tolist()):
+        if not valid[i]:
+            results.append(
+                {"pixel": _echo_pixel(pixel_x, pixel_y), "status": "invalid_pixel"}
+            )
+        elif not hit[i]:
+            results.append({"pixel": [pixel_x, pixel_y], "status": "no_intersection"})
+        else:
+            results.append(
+                {
+                    "pixel": [pixel_x, pixel_y],
+                    "status": "ok",
+                    "longitude": float(lon[i]),
+                    "latitude": float(lat[i]),
+                    "height": float(points[i, 2]),
+                }
+            )
+
+    return JSONResponse(
+        content={
+            "status": "success",
+            "count": len(results),
+            "succeeded": int(hit.sum()),
+            "results": results,
         }
-        for point in points
-    ]
-
-    if not image.calculated_camera_locations:
-        raise HTTPException(status_code=400, detail="图片没有相机位置")
-
-    camera_location = eval(image.calculated_camera_locations)
-    utm = geo_transformer.wgs84_to_utm(camera_location[0], camera_location[1])
-    camera_location = [utm[0], utm[1], camera_location[2]]
-
-    geo_point, steps = pixel_to_geo(
-        pixels,
-        np.array(camera_param.camera_matrix["data"], dtype=np.float64),
-        np.array(camera_param.rotation_matrix["data"], dtype=np.float64),
-        np.array(camera_location, dtype=np.float64),
-        dem,
-        control_points,
     )
-    geo_point = geo_transformer.utm_to_wgs84(float(geo_point[0]), float(geo_point[1]))
 
-    return JSONResponse(content={"status": "success", "geo": geo_point})
+
+@api.post("/images/{image_id}/boundaries")
+async def post_image_boundaries(
+    image_id: int,
+    annotation: BoundaryAnnotation,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """将分割标注的多边形地理化，按 (group, category) 分组返回 GeoJSON"""
+    dem = await _get_dem()
+    context = await _load_camera_context(image_id, db, dem)
+    _require_control_points(context)
+
+    collection = await compute_pool.run(
+        georeference, annotation, context, CONFIG.DEM_FILE_PATH, CONFIG.UTM_EPSG
+    )
+    save_boundaries(context.image_path, collection)
+    remove_terrain_meshes(context.image_path)
+
+    return JSONResponse(content=collection, media_type="application/geo+json")
+
+
+@api.get("/images/{image_id}/boundaries")
+async def get_image_boundaries(image_id: int, db: AsyncSession = Depends(get_async_db)):
+    """获取图片最近一次地理化的边界"""
+    dem = await _get_dem()
+    context = await _load_camera_context(image_id, db, dem)
+
+    collection = load_boundaries(context.image_path)
+    if collection is None:
+        raise HTTPException(status_code=404, detail="图片没有地理化的边界")
+    return JSONResponse(content=collection, media_type="application/geo+json")
+
+
+@api.get("/images/{image_id}/terrain_mesh")
+async def get_image_terrain_mesh(
+    image_id: int,
+    format: Literal["stl", "glb", "ply"] = "stl",
+    decimation: int = Query(0, ge=0, le=MAX_DECIMATION),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    根据图片地理化的边界重建地形网格并下载
+    decimation 为抽稀级别，级别 n 表示每隔 2**n 个 DEM 格点取一个点
+    """
+    dem = await _get_dem()
+    context = await _load_camera_context(image_id, db, dem)
+
+    collection = load_boundaries(context.image_path)
+    if collection is None:
+        raise HTTPException(status_code=404, detail="图片没有地理化的边界")
+    if collection.get("feature_hash") != context.feature_hash:
+        raise HTTPException(status_code=409, detail="特征点已更新，请重新提交边界")
+
+    try:
+        mesh_file = await compute_pool.run(
+            terrain_mesh,
+            context.image_path,
+            collection,
+            CONFIG.DEM_FILE_PATH,
+            CONFIG.UTM_EPSG,
+            format,
+            decimation,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return FileResponse(
+        mesh_file,
+        media_type=MESH_FORMATS[format],
+        filename=f"terrain_{image_id}.{format}",
+    )
+
+
+@api.get("/dem/stats")
+async def get_dem_stats():
+    """获取 DEM 缓存统计信息"""
+    return JSONResponse(content={"status": "success", "stats": dem_registry.stats()})
+
+
+@api.get("/camera_context/stats")
+async def get_camera_context_stats():
+    """获取相机上下文缓存统计信息"""
+    return JSONResponse(
+        content={"status": "success", "stats": camera_context_cache.stats()}
+    )
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.requests import Request
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, delete, insert
 from fastapi.responses import JSONResponse
 import numpy as np
 
@@ -10,14 +10,12 @@ from model.building_point import BuildingPoint as BuildingPointModels
 from model.images import Images as ImagesModel
 from model.camera_param import CameraParam
 from schema.features import UploadFeatures
-from database import get_db
+from database import get_async_db
 
-from service.recycle.main import EPNP_calculate
-from service.recycle.utils import (
-    load_dem_data,
-    load_features_from_orm,
-    load_points_data_from_orm,
-)
+from service.calibration import calibrate_image
+from service.camera_context import camera_context_cache
+from service.jobs import job_queue
+from service.world_raster import remove_world_raster
 
 api = APIRouter(prefix="/api", tags=["features"])
 
@@ -26,152 +24,49 @@ api = APIRouter(prefix="/api", tags=["features"])
 async def upload_features(
     request: Request,
     features: UploadFeatures,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     try:
-        image = (
-            db.query(ImagesModel)
-            .filter(ImagesModel.id == features.features[0].image_id)
-            .first()
+        # 锁定图片行，与后台标定写入相机参数互斥
+        image = await db.get(
+            ImagesModel, features.features[0].image_id, with_for_update=True
         )
         if not image:
             raise HTTPException(status_code=404, detail="图片不存在")
 
         # 删除之前的特征点
-        db.query(FeatureModel).filter(FeatureModel.image_id == image.id).delete()
+        await db.execute(delete(FeatureModel).where(FeatureModel.image_id == image.id))
 
         # 删除之前的相机参数
-        db.query(CameraParam).filter(CameraParam.image_id == image.id).delete()
-
-        image.features = []
-
-        for feature in features.features:
-            feature_model = FeatureModel(
-                pixel_x=feature.x,
-                pixel_y=feature.y,
-                image_id=image.id,
-                building_point_id=feature.building_point_id,
-            )
-            db.add(feature_model)
-        db.commit()
+        await db.execute(delete(CameraParam).where(CameraParam.image_id == image.id))
+
+        await db.execute(
+            insert(FeatureModel),
+            [
+                {
+                    "pixel_x": feature.x,
+                    "pixel_y": feature.y,
+                    "image_id": image.id,
+                    "building_point_id": feature.building_point_id,
+                }
+                for feature in features.features
+            ],
+        )
+        await db.commit()
+        camera_context_cache.invalidate(image.id)
+        remove_world_raster(image.path)
 
         # 只有当特征点数量大于等于4时才计算相机位置
         if len(features.features) >= 4:
-            try:
-                # 获取图片特征点
-                loaded_features = load_features_from_orm(image.id, db)
-                if not loaded_features:
-                    return JSONResponse(
-                        content={"message": "特征点上传成功，但未找到特征点数据"}
-                    )
-
-                # 获取DEM文件路径和特征点文件路径
-                dem = load_dem_data(dem_file_path="./service/recycle/DEM1.tif")
-
-                points = load_points_data_from_orm(loaded_features, dem)
-
-                (
-                    camera_position,
-                    focal_length,
-                    sensor_size,
-                    reprojection_error,
-                    params,
-                ) = EPNP_calculate(points)
-
-                # 更新相机位置
-                db.query(ImagesModel).filter(ImagesModel.id == image.id).update(
-                    {"calculated_camera_locations": str(camera_position)}
-                )
-
-                # 保存相机参数到数据库
-                # 转换numpy数组为字典格式以便存储
-                # 处理相机内参矩阵K
-                if "K" in params and hasattr(params["K"], "tolist"):
-                    camera_matrix_dict = {
-                        "data": params["K"].tolist(),
-                        "shape": params["K"].shape,
-                        "dtype": str(params["K"].dtype),
-                    }
-                else:
-                    camera_matrix_dict = {
-                        "data": [],
-                        "shape": (0, 0),
-                        "dtype": "unknown",
-                    }
-
-                # 处理旋转矩阵R
-                rotation_matrix_dict = None
-                if "R" in params and hasattr(params["R"], "tolist"):
-                    rotation_matrix_dict = {
-                        "data": params["R"].tolist(),
-                        "shape": params["R"].shape,
-                        "dtype": str(params["R"].dtype),
-                    }
-
-                # 处理畸变系数dist_coeffs
-                dist_coeffs_dict = None
-                if "dist_coeffs" in params and hasattr(params["dist_coeffs"], "tolist"):
-                    dist_coeffs_dict = {
-                        "data": params["dist_coeffs"].tolist(),
-                        "shape": params["dist_coeffs"].shape,
-                        "dtype": str(params["dist_coeffs"].dtype),
-                    }
-
-                # 处理优化后的旋转向量optimized_rotation_vector
-                optimized_rotation_vector_dict = None
-                if "optimized_rotation_vector" in params and hasattr(
-                    params["optimized_rotation_vector"], "tolist"
-                ):
-                    optimized_rotation_vector_dict = {
-                        "data": params["optimized_rotation_vector"].tolist(),
-                        "shape": params["optimized_rotation_vector"].shape,
-                        "dtype": str(params["optimized_rotation_vector"].dtype),
-                    }
-
-                # 处理优化后的平移向量optimized_translation_vector
-                optimized_translation_vector_dict = None
-                if "optimized_translation_vector" in params and hasattr(
-                    params["optimized_translation_vector"], "tolist"
-                ):
-                    optimized_translation_vector_dict = {
-                        "data": params["optimized_translation_vector"].tolist(),
-                        "shape": params["optimized_translation_vector"].shape,
-                        "dtype": str(params["optimized_translation_vector"].dtype),
-                    }
-
-                # 创建相机参数记录
-                camera_param = CameraParam(
-                    image_id=image.id,
-                    focal_length=focal_length,
-                    sensor_width=sensor_size[0],
-                    sensor_height=sensor_size[1],
-                    reprojection_error=reprojection_error,
-                    camera_matrix=camera_matrix_dict,
-                    rotation_matrix=rotation_matrix_dict,
-                    dist_coeffs=dist_coeffs_dict,
-                    optimized_rotation_vector=optimized_rotation_vector_dict,
-                    optimized_translation_vector=optimized_translation_vector_dict,
-                )
-
-                db.add(camera_param)
-                db.commit()
-
-                return JSONResponse(
-                    content={
-                        "status": "success",
-                        "message": f"""特征点上传成功且相机位置计算完成，相机参数如下：焦距：{focal_length} mm，传感器尺寸：{sensor_size[0]} x {sensor_size[1]} mm，重投影误差：{reprojection_error} px,相机原点：{camera_position}
-""",
-                    }
-                )
-            except Exception as calc_error:
-                db.rollback()
-                # 即使相机位置计算失败，特征点上传还是成功的
-                return JSONResponse(
-                    content={
-                        "status": "partial_success",
-                        "message": f"特征点上传成功，但相机位置计算失败: {str(calc_error)}",
-                    }
-                )
+            # 相机位置计算耗时较长，交给后台任务执行
+            job = job_queue.submit("calibration", calibrate_image, image.id)
+            return JSONResponse(
+                content={
+                    "status": "accepted",
+                    "message": "特征点上传成功，相机位置计算已加入后台任务",
+                    "job_id": job.id,
+                }
+            )
         else:
             return JSONResponse(
                 content={
@@ -179,5 +74,5 @@ async def upload_features(
                 }
             )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"上传特征点时发生错误: {str(e)}")
@@ -1,43 +1,146 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
-from sqlalchemy.orm import Session
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, File, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.requests import Request
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pathlib import Path
 import os
 import uuid
 
+from config import CONFIG
+from model.camera_param import CameraParam
 from model.images import Images as ImagesModel
 from model.feature import Feature as FeatureModel
-from database import get_db
+from database import get_async_db
+from service.storage import (
+    UPLOAD_DIR,
+    UploadTooLargeError,
+    save_upload_to_temp,
+    uploaded_image_file,
+)
+from service.boundaries import remove_boundaries
+from service.camera_context import camera_context_cache
+from service.jobs import job_queue
+from service.recycle.utils import feature_rows_statement
+from service.pagination import keyset_page, page_headers
+from service.terrain_mesh import remove_terrain_meshes
+from service.thumbnails import (
+    build_thumbnail,
+    file_sha256,
+    remove_thumbnails,
+    thumbnail_file,
+    thumbnail_url,
+)
+from service.tiles import (
+    TILE_FORMATS,
+    build_tile_pyramid_job,
+    load_pyramid_meta,
+    remove_tile_pyramid,
+    tile_file,
+)
+from service.world_raster import remove_world_raster
 
 api = APIRouter(prefix="/api", tags=["images"])
 
-# 创建上传目录
-UPLOAD_DIR = Path(__file__).parent.parent / "static" / "uploaded_images"
-UPLOAD_DIR.mkdir(exist_ok=True)
-
 
 @api.get("/images")
-async def get_images(db: Session = Depends(get_db)):
-    """获取所有图片列表"""
+async def get_images(
+    after_id: int | None = None,
+    limit: int | None = Query(None, ge=1, le=CONFIG.MAX_PAGE_SIZE),
+    q: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    获取图片列表
+    支持按 id 键集分页（after_id、limit）和名称前缀搜索（q），
+    总数和下一页游标通过 X-Total-Count、X-Next-After-Id 响应头返回
+    """
     try:
-        images = db.query(ImagesModel).all()
-        return [
-            {
-                "id": img.id,
-                "name": img.name,
-                "path": img.path,
-            }
-            for img in images
-        ]
+        images, total = await keyset_page(
+            db,
+            select(
+                ImagesModel.id, ImagesModel.name, ImagesModel.path, ImagesModel.sha256
+            ),
+            ImagesModel.id,
+            ImagesModel.name,
+            after_id,
+            limit,
+            q,
+        )
+        return JSONResponse(
+            content=[
+                {
+                    "id": img.id,
+                    "name": img.name,
+                    "path": img.path,
+                    "thumbnail_url": _thumbnail_url(img),
+                }
+                for img in images
+            ],
+            headers=page_headers(images, total, limit),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _thumbnail_url(image) -> str:
+    """已生成的缩略图直接返回静态地址，否则返回按需生成的接口地址"""
+    size = CONFIG.THUMBNAIL_SIZES[0]
+    if image.sha256 and thumbnail_file(image.sha256, size).exists():
+        return thumbnail_url(image.sha256, size)
+    return f"/api/images/{image.id}/thumbnail?size={size}"
+
+
+@api.get("/images/{image_id}/thumbnail")
+async def get_image_thumbnail(
+    image_id: int, size: int | None = None, db: AsyncSession = Depends(get_async_db)
+):
+    """获取图片缩略图，首次请求时生成并缓存到磁盘"""
+    size = size or CONFIG.THUMBNAIL_SIZES[0]
+    if size not in CONFIG.THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=400, detail=f"缩略图尺寸必须是 {CONFIG.THUMBNAIL_SIZES} 之一"
+        )
+
+    image = await db.get(ImagesModel, image_id)
+    if not image:
+        raise HTTPException(status_code=404, detail="图片未找到")
+    file_path = uploaded_image_file(image.path)
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="图片文件不存在")
+
+    sha256 = image.sha256
+    if sha256 is None:
+        # 早于内容哈希功能上传的图片，补算哈希
+        sha256 = await run_in_threadpool(file_sha256, file_path)
+        image.sha256 = sha256
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+
+    try:
+        path = await run_in_threadpool(
+            build_thumbnail, image.path, sha256, size, CONFIG.THUMBNAIL_QUALITY
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # 文件名包含内容哈希，内容不会变化
+    return FileResponse(
+        path,
+        media_type="image/jpeg",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
 @api.get("/images/{image_id}")
-async def get_image(image_id: int, db: Session = Depends(get_db)):
+async def get_image(image_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取图片信息"""
     try:
-        image = db.query(ImagesModel).filter(ImagesModel.id == image_id).first()
+        image = await db.get(ImagesModel, image_id)
         if not image:
             raise HTTPException(status_code=404, detail="图片未找到")
 
@@ -45,6 +148,8 @@ async def get_image(image_id: int, db: Session = Depends(get_db)):
             "id": image.id,
             "name": image.name,
             "path": image.path,  # 返回相对路径给前端
+            "sha256": image.sha256,
+            "pyramid": _pyramid_info(image),
         }
     except HTTPException:
         raise
@@ -53,78 +158,184 @@ async def get_image(image_id: int, db: Session = Depends(get_db)):
 
 
 @api.get("/images/{image_id}/features")
-async def get_image_features(image_id: int, db: Session = Depends(get_db)):
+async def get_image_features(image_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取图片的标注信息"""
     try:
-        image = db.query(ImagesModel).filter(ImagesModel.id == image_id).first()
+        image = await db.get(ImagesModel, image_id)
         if not image:
             raise HTTPException(status_code=404, detail="图片未找到")
 
-        features = (
-            db.query(FeatureModel).filter(FeatureModel.image_id == image_id).all()
-        )
+        # 一次联表查询取出特征点和建筑点信息
+        rows = (await db.execute(feature_rows_statement(image_id))).all()
         return [
             {
-                "id": f.id,
-                "name": f.building_point.name,
-                "pixel_x": f.pixel_x,
-                "pixel_y": f.pixel_y,
-                "longitude": f.building_point.longitude,
-                "latitude": f.building_point.latitude,
-                "building_point_id": f.building_point_id,
+                "id": row.id,
+                "name": row.name,
+                "pixel_x": row.pixel_x,
+                "pixel_y": row.pixel_y,
+                "longitude": row.longitude,
+                "latitude": row.latitude,
+                "building_point_id": row.building_point_id,
             }
-            for f in features
+            for row in rows
         ]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _pyramid_info(image: ImagesModel) -> dict | None:
+    """瓦片金字塔元数据，附带瓦片地址模板；未生成时返回 None"""
+    meta = load_pyramid_meta(image.path)
+    if meta is None:
+        return None
+    return {
+        **meta,
+        "tile_url": f"/api/images/{image.id}/tiles/{{level}}/{{col}}_{{row}}.{meta['extension']}",
+    }
+
+
+@api.get("/images/{image_id}/tiles/{level}/{tile_name}")
+async def get_image_tile(
+    image_id: int,
+    level: int,
+    tile_name: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """获取瓦片金字塔中的单个瓦片，tile_name 形如 <列>_<行>.<扩展名>"""
+    image = await db.get(ImagesModel, image_id)
+    if not image:
+        raise HTTPException(status_code=404, detail="图片未找到")
+    meta = load_pyramid_meta(image.path)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="瓦片金字塔尚未生成")
+
+    try:
+        position, extension = tile_name.split(".", 1)
+        col, row = (int(value) for value in position.split("_", 1))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="瓦片不存在")
+    path = tile_file(image.path, level, col, row, extension)
+    if extension != meta["extension"] or not path.exists():
+        raise HTTPException(status_code=404, detail="瓦片不存在")
+
+    stat = path.stat()
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={CONFIG.TILE_CACHE_MAX_AGE}",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(
+        path, media_type=TILE_FORMATS[meta["format"]][1], headers=headers
+    )
+
+
+async def _find_uploaded_image(db: AsyncSession, sha256: str) -> ImagesModel | None:
+    """按内容哈希查找已上传且文件仍存在的图片"""
+    image = await db.scalar(select(ImagesModel).where(ImagesModel.sha256 == sha256))
+    if image and not uploaded_image_file(image.path).exists():
+        # 文件已丢失，清除哈希以便重新上传
+        image.sha256 = None
+        await db.commit()
+        return None
+    return image
+
+
+def _uploaded_image_response(
+    image: ImagesModel, duplicate: bool, tiles_job_id: str | None = None
+) -> dict:
+    return {
+        "status": "success",
+        "id": image.id,
+        "filename": Path(image.path).name,
+        "path": image.path,
+        "sha256": image.sha256,
+        "duplicate": duplicate,
+        "tiles_job_id": tiles_job_id,
+    }
+
+
 @api.post("/upload_image")
-async def upload_image(image: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_image(
+    image: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)
+):
     # 检查文件名是否存在
     if image.filename is None:
         raise ValueError("No filename provided")
 
-    # 生成唯一文件名
+    # 分块写入临时文件并计算哈希，避免整张图片读入内存
+    try:
+        tmp_file, sha256, _ = await save_upload_to_temp(
+            image, CONFIG.MAX_UPLOAD_SIZE, CONFIG.UPLOAD_CHUNK_SIZE
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # 内容相同的图片已上传过时直接返回已有记录
+    existing = await _find_uploaded_image(db, sha256)
+    if existing:
+        os.remove(tmp_file)
+        return _uploaded_image_response(existing, duplicate=True)
+
+    # 生成唯一文件名，原子地移动到上传目录
     file_extension = os.path.splitext(image.filename)[1]
     unique_filename = f"{uuid.uuid4()}{file_extension}"
     file_path = UPLOAD_DIR / unique_filename
-
-    # 保存文件
-    with open(file_path, "wb") as buffer:
-        buffer.write(await image.read())
+    os.replace(tmp_file, file_path)
 
     # 保存到数据库，使用相对路径
     relative_path = f"/static/uploaded_images/{unique_filename}"
-    image_model = ImagesModel(name=image.filename, path=relative_path)
+    image_model = ImagesModel(name=image.filename, path=relative_path, sha256=sha256)
     db.add(image_model)
-    db.commit()
-    db.refresh(image_model)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # 并发上传了相同内容的图片
+        await db.rollback()
+        os.remove(file_path)
+        existing = await _find_uploaded_image(db, sha256)
+        if not existing:
+            raise HTTPException(status_code=500, detail="保存图片记录失败")
+        return _uploaded_image_response(existing, duplicate=True)
 
-    return {"status": "success", "filename": unique_filename, "path": relative_path}
+    # 在后台生成瓦片金字塔
+    tiles_job_id = None
+    if CONFIG.TILE_PYRAMID_ENABLED:
+        tiles_job_id = job_queue.submit(
+            "tile_pyramid", build_tile_pyramid_job, image_model.id
+        ).id
+
+    return _uploaded_image_response(
+        image_model, duplicate=False, tiles_job_id=tiles_job_id
+    )
 
 
 @api.delete("/images/{image_id}")
-async def delete_image(image_id: int, db: Session = Depends(get_db)):
+async def delete_image(image_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     删除图片及其相关数据
     """
     try:
         # 获取图片信息
-        image = db.query(ImagesModel).filter(ImagesModel.id == image_id).first()
+        image = await db.get(ImagesModel, image_id)
         if not image:
             raise HTTPException(status_code=404, detail="图片未找到")
 
-        # 删除图片相关的特征点
-        db.query(FeatureModel).filter(FeatureModel.image_id == image_id).delete()
+        # 删除图片相关的特征点和相机参数
+        await db.execute(delete(FeatureModel).where(FeatureModel.image_id == image_id))
+        await db.execute(delete(CameraParam).where(CameraParam.image_id == image_id))
 
-        # 删除图片文件
-        file_path = (
-            Path(__file__).parent.parent
-            / "static"
-            / "uploaded_images"
-            / Path(image.path).name
-        )
+        # 从数据库中删除图片记录
+        image_path, image_sha256 = image.path, image.sha256
+        await db.delete(image)
+        await db.commit()
+        camera_context_cache.invalidate(image_id)
+
+        # 数据库提交成功后再删除图片文件和派生文件，提交失败时文件保持不变
+        file_path = uploaded_image_file(image_path)
         if file_path.exists():
             try:
                 os.remove(file_path)
@@ -132,13 +343,16 @@ async def delete_image(image_id: int, db: Session = Depends(get_db)):
                 # 文件删除失败，记录日志但继续执行
                 print(f"删除图片文件时出错: {str(e)}")
 
-        # 从数据库中删除图片记录
-        db.delete(image)
-        db.commit()
+        remove_world_raster(image_path)
+        remove_boundaries(image_path)
+        remove_terrain_meshes(image_path)
+        remove_tile_pyramid(image_path)
+        if image_sha256:
+            remove_thumbnails(image_sha256)
 
         return JSONResponse(content={"message": "图片删除成功"})
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"删除图片时发生错误: {str(e)}")
@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from service.jobs import job_queue
+
+api = APIRouter(prefix="/api", tags=["jobs"])
+
+
+@api.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """获取后台任务状态"""
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return JSONResponse(content=job.model_dump(mode="json"))
+
+
+@api.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    """以 Server-Sent Events 推送后台任务进度，任务结束后关闭连接"""
+    if not job_queue.get(job_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    async def event_stream():
+        last_update = None
+        while True:
+            job = job_queue.get(job_id)
+            if job is None:
+                yield 'event: error\ndata: {"detail": "任务不存在"}\n\n'
+                return
+            if job.updated_at != last_update:
+                last_update = job.updated_at
+                yield f"data: {json.dumps(job.model_dump(mode='json'), ensure_ascii=False)}\n\n"
+            if job.finished:
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
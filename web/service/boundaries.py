@@ -0,0 +1,161 @@
+import json
+import os
+import re
+import uuid
+
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+from shapely.geometry import Polygon
+
+from service.camera_context import CameraContext
+from service.recycle.geo_transformer import get_geo_transformer
+from service.recycle.schema import DEMData
+from service.recycle.utils import pixels_to_geo_with_factors
+from service.storage import derived_file
+
+# 地理化后的边界，与上传图片保存在同一目录，供地形重建使用
+BOUNDARIES_SUFFIX = ".boundaries.geojson"
+
+# 大量顶点一次求交时由粗到细采样，避免逐米推进
+STEP_SCHEDULE = (16, 4, 1)
+
+
+class BoundaryObject(BaseModel):
+    """标注文件中的单个分割对象"""
+
+    group: str | int = Field(..., description="分组（用作分组键，只允许字符串或整数）")
+    category: str = Field(..., description="类别")
+    segmentation: List[Tuple[float, float]] = Field(..., description="多边形顶点像素坐标")
+
+    model_config = ConfigDict(extra="allow")
+
+
+class BoundaryAnnotation(BaseModel):
+    """分割标注文件，格式同 before/1898.json"""
+
+    objects: List[BoundaryObject] = Field(..., description="分割对象列表")
+    info: Dict[str, Any] | None = Field(None, description="标注信息")
+
+    model_config = ConfigDict(extra="allow")
+
+
+def sanitize_category(category: str) -> str:
+    """与离线脚本保持一致，类别只保留字母和数字"""
+    return re.sub(r"[^a-zA-Z0-9]", "", category)
+
+
+def georeference_boundaries(
+    annotation: BoundaryAnnotation, context: CameraContext, dem: DEMData
+) -> Dict[str, Any]:
+    """
+    将所有分割多边形的顶点一次性做射线求交，按 (group, category) 分组生成 GeoJSON。
+
+    每个分组输出一个 MultiPolygon 要素，坐标为 (经度, 纬度, 高程)；
+    没有交点的顶点会被丢弃，剩余顶点少于 3 个的多边形不输出。
+    """
+    vertex_counts = [len(obj.segmentation) for obj in annotation.objects]
+    pixels = np.array(
+        [vertex for obj in annotation.objects for vertex in obj.segmentation],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+
+    points = np.full((len(pixels), 3), np.nan)
+    if len(pixels):
+        points, _ = pixels_to_geo_with_factors(
+            pixels,
+            context.K,
+            context.R,
+            context.ray_origin,
+            dem,
+            context.control_pixels,
+            context.optimization_factors,
+            step_schedule=STEP_SCHEDULE,
+        )
+    hit = ~np.isnan(points[:, 0])
+    lon = np.full(len(pixels), np.nan)
+    lat = np.full(len(pixels), np.nan)
+    if hit.any():
+        lon[hit], lat[hit] = get_geo_transformer(dem.utm_epsg).utm_to_wgs84_array(
+            points[hit, 0], points[hit, 1]
+        )
+
+    groups: Dict[Tuple[str | int, str], Dict[str, Any]] = {}
+    offsets = np.concatenate([[0], np.cumsum(vertex_counts)]).astype(int)
+    for i, obj in enumerate(annotation.objects):
+        key = (obj.group, sanitize_category(obj.category))
+        group = groups.setdefault(
+            key,
+            {"polygons": [], "objects": 0, "vertices": 0, "area": 0.0, "perimeter": 0.0},
+        )
+        group["objects"] += 1
+        group["vertices"] += vertex_counts[i]
+
+        index = np.arange(offsets[i], offsets[i + 1])[hit[offsets[i] : offsets[i + 1]]]
+        if len(index) < 3:
+            continue
+        # 面积和周长在 UTM 平面上计算（单位：米）
+        polygon = Polygon(points[index, :2])
+        group["area"] += polygon.area
+        group["perimeter"] += polygon.length
+
+        ring = np.column_stack([lon[index], lat[index], points[index, 2]]).tolist()
+        ring.append(ring[0])
+        group["polygons"].append([ring])
+
+    features = []
+    for (group_name, category), group in groups.items():
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "MultiPolygon", "coordinates": group["polygons"]},
+                "properties": {
+                    "group": group_name,
+                    "category": category,
+                    "objects": group["objects"],
+                    "polygons": len(group["polygons"]),
+                    "area": group["area"],
+                    "perimeter": group["perimeter"],
+                    "vertices": group["vertices"],
+                },
+            }
+        )
+
+    return {
+        "type": "FeatureCollection",
+        "name": (annotation.info or {}).get("name"),
+        "image_id": context.image_id,
+        "feature_hash": context.feature_hash,
+        "vertices": len(pixels),
+        "georeferenced_vertices": int(hit.sum()),
+        "features": features,
+    }
+
+
+def save_boundaries(image_path: str, collection: Dict[str, Any]):
+    """保存地理化后的边界，先写临时文件再替换"""
+    boundaries_file = derived_file(image_path, BOUNDARIES_SUFFIX)
+    tmp_file = boundaries_file.with_name(
+        f"{boundaries_file.name}.{uuid.uuid4().hex}.tmp"
+    )
+    tmp_file.write_text(json.dumps(collection, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_file, boundaries_file)
+
+
+def load_boundaries(image_path: str) -> Dict[str, Any] | None:
+    """读取图片已保存的地理化边界，不存在时返回 None"""
+    try:
+        return json.loads(
+            derived_file(image_path, BOUNDARIES_SUFFIX).read_text(encoding="utf-8")
+        )
+    except FileNotFoundError:
+        return None
+
+
+def remove_boundaries(image_path: str):
+    """删除图片已保存的地理化边界"""
+    try:
+        os.remove(derived_file(image_path, BOUNDARIES_SUFFIX))
+    except FileNotFoundError:
+        pass
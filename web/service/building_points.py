@@ -0,0 +1,140 @@
+import csv
+import io
+import json
+
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from model.building_point import BuildingPoint as BuildingPointModel
+
+# (名称, 经度, 纬度)
+PointRow = Tuple[str, float, float]
+
+IMPORT_FORMATS = ("json", "csv", "geojson")
+
+
+def detect_import_format(filename: str | None, content_type: str | None) -> str:
+    """根据文件扩展名或 Content-Type 判断导入文件格式"""
+    suffix = Path(filename or "").suffix.lower().lstrip(".")
+    if suffix in IMPORT_FORMATS:
+        return suffix
+    content_type = (content_type or "").lower()
+    if "geo+json" in content_type:
+        return "geojson"
+    if "csv" in content_type:
+        return "csv"
+    return "json"
+
+
+def _point_row(name, longitude, latitude) -> PointRow:
+    if name is None or str(name).strip() == "":
+        raise ValueError("建筑点名称不能为空")
+    try:
+        return str(name), float(longitude), float(latitude)
+    except (TypeError, ValueError):
+        raise ValueError(f"建筑点 {name} 的经纬度无效")
+
+
+def _parse_json(content: bytes) -> List[PointRow]:
+    data = json.loads(content)
+    # 兼容 GeoJSON 被当成普通 JSON 上传的情况
+    if isinstance(data, dict) and data.get("type") in ("FeatureCollection", "Feature"):
+        return _parse_geojson_data(data)
+    if isinstance(data, dict):
+        data = data.get("points", [])
+    if not isinstance(data, list):
+        raise ValueError("JSON 格式应为建筑点列表或 {\"points\": [...]}")
+    return [_point_row(p.get("name"), p.get("longitude"), p.get("latitude")) for p in data]
+
+
+def _parse_csv(content: bytes) -> List[PointRow]:
+    reader = csv.DictReader(
+        io.StringIO(content.decode("utf-8-sig")), skipinitialspace=True
+    )
+    fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+    lon_field = fields.get("longitude") or fields.get("lon") or fields.get("lng")
+    lat_field = fields.get("latitude") or fields.get("lat")
+    name_field = fields.get("name")
+    if not (name_field and lon_field and lat_field):
+        raise ValueError("CSV 需要包含 name、longitude、latitude 列")
+    return [
+        _point_row(row[name_field], row[lon_field], row[lat_field]) for row in reader
+    ]
+
+
+def _parse_geojson_data(data: dict) -> List[PointRow]:
+    features = data["features"] if data.get("type") == "FeatureCollection" else [data]
+    points = []
+    for feature in features:
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") != "Point":
+            continue
+        longitude, latitude = geometry["coordinates"][:2]
+        properties = feature.get("properties") or {}
+        points.append(_point_row(properties.get("name"), longitude, latitude))
+    return points
+
+
+def _parse_geojson(content: bytes) -> List[PointRow]:
+    return _parse_geojson_data(json.loads(content))
+
+
+def parse_building_points(content: bytes, file_format: str) -> List[PointRow]:
+    """解析 JSON / CSV / GeoJSON 格式的建筑点文件"""
+    parsers = {"json": _parse_json, "csv": _parse_csv, "geojson": _parse_geojson}
+    if file_format not in parsers:
+        raise ValueError(f"不支持的文件格式: {file_format}")
+    try:
+        return parsers[file_format](content)
+    except (KeyError, AttributeError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"无法解析{file_format}文件: {e}")
+
+
+def import_building_points(
+    db: Session, points: Iterable[PointRow], batch_size: int = 1000
+) -> Tuple[int, int]:
+    """
+    批量导入建筑点，按 (名称, 经度, 纬度) 去重。
+
+    每批只用一次查询取出同名的已有建筑点，在内存中做集合比对，
+    新建筑点通过 executemany 一次插入。
+    :return: (新建数量, 已存在数量)
+    """
+    created_count = 0
+    existing_count = 0
+    seen = set()
+
+    points = list(points)
+    for start in range(0, len(points), batch_size):
+        batch = points[start : start + batch_size]
+        names = {name for name, _, _ in batch}
+        existing = {
+            tuple(row)
+            for row in db.query(
+                BuildingPointModel.name,
+                BuildingPointModel.longitude,
+                BuildingPointModel.latitude,
+            )
+            .filter(BuildingPointModel.name.in_(names))
+            .all()
+        }
+
+        rows = []
+        for point in batch:
+            # 同一文件中的重复点也算作已存在
+            if point in existing or point in seen:
+                existing_count += 1
+                continue
+            seen.add(point)
+            name, longitude, latitude = point
+            rows.append({"name": name, "longitude": longitude, "latitude": latitude})
+
+        if rows:
+            db.execute(insert(BuildingPointModel), rows)
+            created_count += len(rows)
+
+    db.commit()
+    return created_count, existing_count
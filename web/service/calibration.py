@@ -0,0 +1,147 @@
+from typing import Any, Dict
+
+from config import CONFIG
+from database import SessionLocal
+from model.camera_param import CameraParam
+from model.images import Images as ImagesModel
+from service.camera_context import (
+    camera_context_cache,
+    feature_rows_hash,
+    get_camera_context,
+)
+from service.compute import calibrate, compute_pool, world_raster
+from service.jobs import JobReporter, job_queue
+from service.recycle.dem_cache import dem_registry
+from service.recycle.geo_transformer import get_geo_transformer
+from service.recycle.utils import (
+    features_from_rows,
+    load_feature_rows,
+    load_points_data_from_orm,
+)
+
+
+def _feature_snapshot(db, image_id: int) -> str:
+    """
+    图片当前特征点内容的哈希，用于判断计算期间特征点是否被重新上传。
+    SQLite 会复用删除后的行号，因此比较像素坐标和建筑点等行内容而不是特征点ID。
+    """
+    return feature_rows_hash(load_feature_rows(image_id, db))
+
+
+def calibrate_image(report: JobReporter, image_id: int) -> Dict[str, Any]:
+    """
+    后台任务：根据图片特征点计算相机位置和相机参数，并保存到数据库。
+    """
+    db = SessionLocal()
+    try:
+        report(0.05, "加载特征点")
+        rows = load_feature_rows(image_id, db)
+        snapshot = feature_rows_hash(rows)
+
+        # 获取图片特征点
+        loaded_features = features_from_rows(rows)
+
+        report(0.15, "加载DEM数据")
+        dem = dem_registry.get(CONFIG.DEM_FILE_PATH, utm_epsg=CONFIG.UTM_EPSG)
+        points = load_points_data_from_orm(loaded_features, dem)
+
+        report(0.3, "求解相机参数")
+        (
+            camera_position,
+            focal_length,
+            sensor_size,
+            reprojection_error,
+            params,
+        ) = compute_pool.run_sync(
+            calibrate,
+            points,
+            dem.utm_epsg,
+            CONFIG.EPNP_EXECUTOR,
+            CONFIG.EPNP_WORKERS,
+            CONFIG.EPNP_REFINE_FOCAL,
+        )
+
+        report(0.9, "保存相机参数")
+        # 更新相机位置，同时保存 UTM 坐标供像素→地理坐标计算直接使用。
+        # 先写图片行：SQLite 下由此取得写锁，其他数据库下锁定该图片行（上传特征点时同样锁定），
+        # 之后在同一事务内重新检查特征点，保证写入的相机参数与本次使用的特征点一致
+        camera_lon, camera_lat, camera_height = map(float, camera_position)
+        camera_easting, camera_northing = get_geo_transformer(
+            dem.utm_epsg
+        ).wgs84_to_utm(camera_lon, camera_lat)
+        db.query(ImagesModel).filter(ImagesModel.id == image_id).update(
+            {
+                "camera_lon": camera_lon,
+                "camera_lat": camera_lat,
+                "camera_height": camera_height,
+                "camera_easting": float(camera_easting),
+                "camera_northing": float(camera_northing),
+                "camera_utm_epsg": dem.utm_epsg,
+            }
+        )
+        if _feature_snapshot(db, image_id) != snapshot:
+            raise RuntimeError("计算期间特征点已被重新上传，本次结果已丢弃")
+
+        # 删除之前的相机参数
+        db.query(CameraParam).filter(CameraParam.image_id == image_id).delete()
+
+        # 创建相机参数记录，numpy数组由 NumpyArray 列类型直接以二进制存储
+        camera_param = CameraParam(
+            image_id=image_id,
+            focal_length=focal_length,
+            sensor_width=sensor_size[0],
+            sensor_height=sensor_size[1],
+            reprojection_error=reprojection_error,
+            camera_matrix=params["K"],
+            rotation_matrix=params.get("R"),
+            dist_coeffs=params.get("dist_coeffs"),
+            optimized_rotation_vector=params.get("optimized_rotation_vector"),
+            optimized_translation_vector=params.get("optimized_translation_vector"),
+        )
+
+        db.add(camera_param)
+        db.commit()
+        camera_context_cache.invalidate(image_id)
+
+        # 标定成功后在后台生成像素→地理坐标查找栅格
+        world_raster_job_id = None
+        if CONFIG.WORLD_RASTER_ENABLED:
+            world_raster_job_id = job_queue.submit(
+                "world_raster", build_world_raster_job, image_id
+            ).id
+
+        return {
+            "image_id": image_id,
+            "world_raster_job_id": world_raster_job_id,
+            "camera_position": list(camera_position),
+            "focal_length": focal_length,
+            "sensor_size": list(sensor_size),
+            "reprojection_error": reprojection_error,
+            "message": f"相机位置计算完成，相机参数如下：焦距：{focal_length} mm，传感器尺寸：{sensor_size[0]} x {sensor_size[1]} mm，重投影误差：{reprojection_error} px,相机原点：{camera_position}",
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def build_world_raster_job(report: JobReporter, image_id: int) -> Dict[str, Any]:
+    """后台任务：相机标定成功后在计算进程池中生成图片的像素→地理坐标查找栅格"""
+    db = SessionLocal()
+    try:
+        report(0.05, "加载相机参数")
+        dem = dem_registry.get(CONFIG.DEM_FILE_PATH, utm_epsg=CONFIG.UTM_EPSG)
+        context = get_camera_context(image_id, db, dem)
+    finally:
+        db.close()
+
+    report(0.1, "计算查找栅格")
+    result = compute_pool.run_sync(
+        world_raster,
+        context,
+        CONFIG.DEM_FILE_PATH,
+        CONFIG.UTM_EPSG,
+        CONFIG.WORLD_RASTER_STRIDE,
+    )
+    return {"image_id": image_id, **result}
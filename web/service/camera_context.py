@@ -0,0 +1,320 @@
+import hashlib
+import threading
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import CONFIG
+from model.camera_param import CameraParam
+from model.images import Images as ImagesModel
+from model.types import encode_array
+from service.recycle.schema import DEMData
+from service.recycle.geo_transformer import get_geo_transformer
+from service.recycle.utils import (
+    feature_rows_statement,
+    features_from_rows,
+    load_feature_rows,
+    load_points_data_from_orm,
+    prepare_control_factors,
+)
+
+
+class CameraContext(BaseModel):
+    """图片相机上下文：相机参数、相机位置、控制点及其优化因子"""
+
+    image_id: int = Field(..., description="图片ID")
+    image_path: str = Field(..., description="图片相对路径")
+    feature_hash: str = Field(..., description="生成该上下文时特征点数据的哈希")
+    camera_param_id: int = Field(..., description="相机参数ID")
+    camera_version: str = Field(
+        ..., description="生成该上下文时相机参数和相机位置的哈希"
+    )
+    dem_identity: Tuple[str, int, int] | None = Field(
+        None, description="生成该上下文时使用的 DEM 标识（路径，修改时间，UTM 分带）"
+    )
+    K: np.ndarray = Field(..., description="相机内参矩阵")
+    R: np.ndarray = Field(..., description="旋转矩阵")
+    dist_coeffs: np.ndarray = Field(..., description="畸变系数")
+    rvec: np.ndarray = Field(..., description="优化后的旋转向量")
+    tvec: np.ndarray = Field(..., description="优化后的平移向量")
+    camera_location: Tuple[float, float, float] = Field(
+        ..., description="相机位置（经度，纬度，高程）"
+    )
+    ray_origin: np.ndarray = Field(..., description="相机在UTM坐标系下的位置")
+    control_points: List[Dict[str, Any]] = Field(
+        ..., description="控制点，包含 pixel、pos3d、symbol"
+    )
+    control_pixels: np.ndarray = Field(..., description="控制点像素坐标 (M, 2)")
+    optimization_factors: np.ndarray = Field(..., description="控制点优化因子 (M, 3)")
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
+
+    @property
+    def nbytes(self) -> int:
+        """估算该上下文占用的内存（字节）"""
+        arrays = [
+            self.K,
+            self.R,
+            self.dist_coeffs,
+            self.rvec,
+            self.tvec,
+            self.ray_origin,
+            self.control_pixels,
+            self.optimization_factors,
+        ]
+        size = sum(a.nbytes for a in arrays)
+        for cp in self.control_points:
+            size += 256 + cp["pixel"].nbytes + cp["pos3d"].nbytes
+        return size
+
+
+class CameraContextError(Exception):
+    """构建相机上下文失败，携带建议的HTTP状态码"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def feature_rows_hash(rows: list) -> str:
+    """计算特征点行数据的哈希"""
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(repr(tuple(row)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def camera_version(image: ImagesModel, camera_param: CameraParam) -> str:
+    """
+    计算相机参数和相机位置的哈希。
+    SQLite 会复用删除后的行号，重新标定后相机参数的ID可能不变，因此同时比较数组内容。
+    """
+    digest = hashlib.sha1()
+    digest.update(
+        repr(
+            (
+                camera_param.id,
+                image.camera_lon,
+                image.camera_lat,
+                image.camera_height,
+                image.camera_utm_epsg,
+            )
+        ).encode("utf-8")
+    )
+    for array in (
+        camera_param.camera_matrix,
+        camera_param.rotation_matrix,
+        camera_param.dist_coeffs,
+        camera_param.optimized_rotation_vector,
+        camera_param.optimized_translation_vector,
+    ):
+        digest.update(b"\0" if array is None else encode_array(array))
+    return digest.hexdigest()
+
+
+def _camera_param_statement(image_id: int):
+    return select(CameraParam).where(CameraParam.image_id == image_id).limit(1)
+
+
+def _check_camera_rows(
+    image: ImagesModel | None, camera_param: CameraParam | None
+) -> Tuple[ImagesModel, CameraParam]:
+    if not image:
+        raise CameraContextError(404, "图片未找到")
+    if not camera_param:
+        raise CameraContextError(404, "相机参数未找到")
+    return image, camera_param
+
+
+def load_camera_rows(image_id: int, db: Session) -> Tuple[ImagesModel, CameraParam]:
+    """读取图片和相机参数，不存在时抛出 CameraContextError"""
+    return _check_camera_rows(
+        db.get(ImagesModel, image_id),
+        db.scalar(_camera_param_statement(image_id)),
+    )
+
+
+async def load_camera_rows_async(
+    image_id: int, db: AsyncSession
+) -> Tuple[ImagesModel, CameraParam]:
+    """load_camera_rows 的异步会话版本"""
+    return _check_camera_rows(
+        await db.get(ImagesModel, image_id),
+        await db.scalar(_camera_param_statement(image_id)),
+    )
+
+
+def build_camera_context(
+    image: ImagesModel, camera_param: CameraParam, rows: list, dem: DEMData
+) -> CameraContext:
+    """根据已读取的图片、相机参数和特征点行构建相机上下文"""
+    points = load_points_data_from_orm(features_from_rows(rows), dem)
+    if not points:
+        raise CameraContextError(400, "图片没有特征点")
+
+    if image.camera_lon is None:
+        raise CameraContextError(400, "图片没有相机位置")
+
+    lon, lat, height = image.camera_lon, image.camera_lat, image.camera_height
+    if image.camera_utm_epsg == dem.utm_epsg:
+        easting, northing = image.camera_easting, image.camera_northing
+    else:
+        # DEM 的 UTM 分带与标定时不同，重新投影
+        easting, northing = get_geo_transformer(dem.utm_epsg).wgs84_to_utm(lon, lat)
+    ray_origin = np.array([easting, northing, height], dtype=np.float64)
+
+    K = camera_param.camera_matrix
+    R = camera_param.rotation_matrix
+    control_points = [
+        {"pixel": point.pixel, "pos3d": point.pos3d, "symbol": point.symbol}
+        for point in points
+    ]
+    control_pixels, optimization_factors = prepare_control_factors(
+        control_points, K, R, ray_origin
+    )
+
+    return CameraContext(
+        image_id=image.id,
+        image_path=image.path,
+        feature_hash=feature_rows_hash(rows),
+        camera_param_id=camera_param.id,
+        camera_version=camera_version(image, camera_param),
+        dem_identity=dem.identity,
+        K=K,
+        R=R,
+        dist_coeffs=camera_param.dist_coeffs,
+        rvec=camera_param.optimized_rotation_vector,
+        tvec=camera_param.optimized_translation_vector,
+        camera_location=(float(lon), float(lat), float(height)),
+        ray_origin=ray_origin,
+        control_points=control_points,
+        control_pixels=control_pixels,
+        optimization_factors=optimization_factors,
+    )
+
+
+class CameraContextCache:
+    """相机上下文 LRU 缓存
+
+    以 (图片ID, 特征点哈希, 相机参数哈希, DEM 标识) 为键，按条目数和估算内存占用双重限制容量。
+    重新标定或 DEM 文件更新后键随之变化，invalidate 之后才写入的旧上下文不会再被命中。
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, CameraContext]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(context: CameraContext) -> Tuple:
+        return (
+            context.image_id,
+            context.feature_hash,
+            context.camera_version,
+            context.dem_identity,
+        )
+
+    def get(
+        self,
+        image_id: int,
+        feature_hash: str,
+        camera_version: str,
+        dem_identity: Tuple[str, int, int] | None,
+    ) -> CameraContext | None:
+        key = (image_id, feature_hash, camera_version, dem_identity)
+        with self._lock:
+            context = self._entries.get(key)
+            if context is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return context
+
+    def put(self, context: CameraContext):
+        key = self._key(context)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = context
+            self._bytes += context.nbytes
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def invalidate(self, image_id: int):
+        """清除图片的所有缓存上下文"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == image_id]:
+                self._bytes -= self._entries.pop(key).nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+camera_context_cache = CameraContextCache(
+    max_entries=CONFIG.CAMERA_CONTEXT_CACHE_SIZE,
+    max_bytes=CONFIG.CAMERA_CONTEXT_CACHE_BYTES,
+)
+
+
+def get_camera_context(image_id: int, db: Session, dem: DEMData) -> CameraContext:
+    """获取图片的相机上下文，特征点、相机参数和 DEM 都未变化时直接使用缓存"""
+    image, camera_param = load_camera_rows(image_id, db)
+    rows = load_feature_rows(image_id, db)
+
+    context = camera_context_cache.get(
+        image_id,
+        feature_rows_hash(rows),
+        camera_version(image, camera_param),
+        dem.identity,
+    )
+    if context is None:
+        context = build_camera_context(image, camera_param, rows, dem)
+        camera_context_cache.put(context)
+    return context
+
+
+async def get_camera_context_async(
+    image_id: int, db: AsyncSession, dem: DEMData
+) -> CameraContext:
+    """
+    get_camera_context 的异步会话版本，供路由使用。
+    数据通过 AsyncSession 读取；缓存未命中时 DEM 采样和优化因子计算在线程池中执行，不阻塞事件循环。
+    """
+    image, camera_param = await load_camera_rows_async(image_id, db)
+    rows = (await db.execute(feature_rows_statement(image_id))).all()
+
+    context = camera_context_cache.get(
+        image_id,
+        feature_rows_hash(rows),
+        camera_version(image, camera_param),
+        dem.identity,
+    )
+    if context is None:
+        context = await run_in_threadpool(
+            build_camera_context, image, camera_param, rows, dem
+        )
+        camera_context_cache.put(context)
+    return context
@@ -0,0 +1,193 @@
+import asyncio
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from service.boundaries import BoundaryAnnotation, georeference_boundaries
+from service.camera_context import CameraContext
+from service.recycle.dem_cache import dem_registry
+from service.recycle.dem_sampler import DEMSampler
+from service.recycle.geo_transformer import get_geo_transformer
+from service.recycle.main import EPNP_calculate, reprojection_point
+from service.recycle.schema import DEMData
+from service.recycle.utils import pixels_to_geo_with_factors
+from service.terrain_mesh import get_terrain_mesh
+from service.world_raster import build_world_raster
+
+
+class ComputePool:
+    """
+    CPU 密集计算的进程池。
+
+    由应用的 lifespan 启动和关闭；未启动（或进程数为 0）时在线程池中执行。
+    子进程使用 spawn 方式创建，DEM 只按路径传递，由子进程自己的 dem_registry 加载和缓存。
+    """
+
+    def __init__(self):
+        self._executor: ProcessPoolExecutor | None = None
+        self.workers = 0
+
+    def start(
+        self,
+        workers: int | None,
+        dem_file_path: str | Path | None = None,
+        utm_epsg: int | None = None,
+    ):
+        """启动进程池，workers 为空时使用 CPU 核数，为 0 时不启动"""
+        if self._executor is not None or workers == 0:
+            return
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(str(dem_file_path) if dem_file_path else None, utm_epsg),
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self.workers = 0
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """在进程池中执行计算函数，不阻塞事件循环"""
+        if self._executor is None:
+            return await run_in_threadpool(fn, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def run_sync(self, fn: Callable, *args, **kwargs):
+        """在后台任务线程中同步等待进程池的计算结果"""
+        if self._executor is None:
+            return fn(*args, **kwargs)
+        return self._executor.submit(fn, *args, **kwargs).result()
+
+    def stats(self) -> dict:
+        return {"workers": self.workers}
+
+
+compute_pool = ComputePool()
+
+
+def _init_worker(dem_file_path: str | None, utm_epsg: int | None):
+    """子进程启动时预加载 DEM，避免首个计算请求承担栅格读取开销"""
+    if dem_file_path is None:
+        return
+    try:
+        dem_registry.get(dem_file_path, utm_epsg=utm_epsg)
+    except Exception as e:
+        print(f"计算进程预加载 DEM 失败，将在首次使用时加载: {str(e)}")
+
+
+def _dem(dem_file_path: str | Path, utm_epsg: int | None) -> DEMData:
+    return dem_registry.get(dem_file_path, utm_epsg=utm_epsg)
+
+
+# 以下为在进程池中执行的计算入口，参数和返回值都需要可以 pickle
+
+
+def geo_to_pixel(
+    context: CameraContext,
+    lonlat: np.ndarray,
+    dem_file_path: str | Path,
+    utm_epsg: int | None,
+) -> List[List[float]] | None:
+    """将经纬度投影到图片像素坐标，坐标超出 DEM 范围时返回 None"""
+    dem = _dem(dem_file_path, utm_epsg)
+    point_highs = DEMSampler(dem).sample(lonlat, coord_type="wgs84")
+    if np.isnan(point_highs).any():
+        return None
+    eastings, northings = get_geo_transformer(dem.utm_epsg).wgs84_to_utm_array(
+        lonlat[:, 0], lonlat[:, 1]
+    )
+    pos3d = np.column_stack([eastings, northings, point_highs]).astype(np.float64)
+    return reprojection_point(
+        pos3d,
+        context.K,
+        context.dist_coeffs,
+        context.rvec,
+        context.tvec,
+    )
+
+
+def pixels_to_geo(
+    context: CameraContext,
+    pixels: np.ndarray,
+    dem_file_path: str | Path,
+    utm_epsg: int | None,
+) -> np.ndarray:
+    """批量射线求交，返回像素对应的 UTM 交点 (N, 3)，无交点为 NaN"""
+    points, _ = pixels_to_geo_with_factors(
+        pixels,
+        context.K,
+        context.R,
+        context.ray_origin,
+        _dem(dem_file_path, utm_epsg),
+        context.control_pixels,
+        context.optimization_factors,
+    )
+    return points
+
+
+def georeference(
+    annotation: BoundaryAnnotation,
+    context: CameraContext,
+    dem_file_path: str | Path,
+    utm_epsg: int | None,
+) -> Dict[str, Any]:
+    """将分割标注地理化为 GeoJSON"""
+    return georeference_boundaries(annotation, context, _dem(dem_file_path, utm_epsg))
+
+
+def terrain_mesh(
+    image_path: str,
+    collection: Dict[str, Any],
+    dem_file_path: str | Path,
+    utm_epsg: int | None,
+    file_format: str,
+    decimation: int,
+) -> Path:
+    """重建并导出地形网格"""
+    return get_terrain_mesh(
+        image_path,
+        collection,
+        dem_file_path,
+        _dem(dem_file_path, utm_epsg),
+        file_format,
+        decimation,
+    )
+
+
+def world_raster(
+    context: CameraContext,
+    dem_file_path: str | Path,
+    utm_epsg: int | None,
+    stride: int,
+) -> Dict[str, Any]:
+    """生成像素→地理坐标查找栅格"""
+    return build_world_raster(context, _dem(dem_file_path, utm_epsg), stride)
+
+
+def calibrate(
+    points: list,
+    utm_epsg: int,
+    executor: str,
+    workers: int | None,
+    refine_focal: bool,
+):
+    """求解相机参数，返回值同 EPNP_calculate"""
+    return EPNP_calculate(
+        points,
+        executor=executor,
+        workers=workers,
+        refine_focal=refine_focal,
+        transformer=get_geo_transformer(utm_epsg),
+    )
@@ -0,0 +1,120 @@
+import threading
+import time
+import traceback
+import uuid
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Literal
+
+from pydantic import BaseModel, Field
+
+from config import CONFIG
+
+
+class Job(BaseModel):
+    """后台任务状态"""
+
+    id: str = Field(..., description="任务ID")
+    kind: str = Field(..., description="任务类型")
+    status: Literal["pending", "running", "succeeded", "failed"] = Field(
+        "pending", description="任务状态"
+    )
+    progress: float = Field(0.0, description="任务进度，0 到 1")
+    message: str = Field("", description="任务当前说明")
+    result: Dict[str, Any] | None = Field(None, description="任务结果")
+    error: str | None = Field(None, description="任务失败原因")
+    created_at: float = Field(default_factory=time.time, description="创建时间")
+    updated_at: float = Field(default_factory=time.time, description="更新时间")
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+
+class JobReporter:
+    """任务进度回调，传给任务函数用于上报进度"""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self._queue = queue
+        self._job_id = job_id
+
+    def __call__(self, progress: float, message: str = ""):
+        self._queue._update(self._job_id, progress=progress, message=message)
+
+
+class JobQueue:
+    """进程内后台任务队列
+
+    任务在线程池中执行，状态保存在内存中，仅保留最近 history_size 个任务。
+    """
+
+    def __init__(self, max_workers: int = 2, history_size: int = 1000):
+        self.max_workers = max_workers
+        self.history_size = history_size
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="job"
+            )
+        return self._executor
+
+    def submit(
+        self, kind: str, fn: Callable[..., Dict[str, Any] | None], *args, **kwargs
+    ) -> Job:
+        """提交任务，fn 的第一个参数为 JobReporter，返回值作为任务结果"""
+        job = Job(id=uuid.uuid4().hex, kind=kind, message="等待执行")
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history_size:
+                self._jobs.popitem(last=False)
+            executor = self._get_executor()
+        executor.submit(self._run, job.id, fn, args, kwargs)
+        return job.model_copy()
+
+    def _run(self, job_id: str, fn, args, kwargs):
+        self._update(job_id, status="running", message="正在执行")
+        try:
+            result = fn(JobReporter(self, job_id), *args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status="failed", error=str(e), message="任务失败")
+        else:
+            self._update(
+                job_id,
+                status="succeeded",
+                progress=1.0,
+                result=result,
+                message="任务完成",
+            )
+
+    def _update(self, job_id: str, **changes):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            for key, value in changes.items():
+                setattr(job, key, value)
+            job.updated_at = time.time()
+
+    def get(self, job_id: str) -> Job | None:
+        """获取任务状态的快照"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy() if job is not None else None
+
+    def shutdown(self, wait: bool = False):
+        """关闭线程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+job_queue: JobQueue = JobQueue(
+    max_workers=CONFIG.JOB_WORKERS, history_size=CONFIG.JOB_HISTORY_SIZE
+)
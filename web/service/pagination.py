@@ -0,0 +1,46 @@
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# 前缀查询的上界：在前缀后追加最大的 Unicode 字符
+_PREFIX_UPPER_BOUND = "\U0010ffff"
+
+
+async def keyset_page(
+    db: AsyncSession,
+    statement: Select,
+    id_column,
+    name_column,
+    after_id: int | None = None,
+    limit: int | None = None,
+    q: str | None = None,
+) -> Tuple[List[Any], int]:
+    """
+    按 id 做键集分页，并按名称前缀过滤。
+
+    前缀过滤写成 name >= q AND name < q + U+10FFFF 的范围条件，可以直接使用 name 列的索引。
+    :return: (当前页数据, 满足过滤条件的总数)
+    """
+    if q:
+        statement = statement.where(
+            name_column >= q, name_column < q + _PREFIX_UPPER_BOUND
+        )
+    total = await db.scalar(
+        select(func.count()).select_from(statement.order_by(None).subquery())
+    )
+
+    if after_id is not None:
+        statement = statement.where(id_column > after_id)
+    statement = statement.order_by(id_column)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return (await db.execute(statement)).all(), total
+
+
+def page_headers(rows: List[Any], total: int, limit: int | None) -> Dict[str, str]:
+    """分页信息放在响应头中返回，响应体保持为数组"""
+    headers = {"X-Total-Count": str(total)}
+    if limit is not None and len(rows) == limit:
+        headers["X-Next-After-Id"] = str(rows[-1].id)
+    return headers
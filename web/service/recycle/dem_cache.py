@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, Tuple
+
+from service.recycle.schema import DEMData
+from service.recycle.utils import load_dem_data
+
+
+class DEMRegistry:
+    """进程级 DEM 缓存
+
+    按文件路径缓存只读的 DEMData，文件修改时间 (mtime) 变化时自动重新加载，
+    并统计命中/未命中次数与加载耗时。
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[int, int | None, DEMData]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.total_load_time = 0.0
+        self.last_load_time = 0.0
+
+    @staticmethod
+    def _key(dem_file_path: str | Path) -> str:
+        return str(Path(dem_file_path).resolve())
+
+    def get(self, dem_file_path: str | Path, utm_epsg: int | None = None) -> DEMData:
+        """获取 DEM 数据，未缓存或文件已更新时重新加载
+
+        utm_epsg 为空时根据 DEM 位置自动选择 UTM 分带。
+        """
+        key = self._key(dem_file_path)
+        try:
+            mtime = os.stat(key).st_mtime_ns
+        except OSError:
+            raise RuntimeError(f"无法加载 DEM 文件: {dem_file_path}")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[:2] == (mtime, utm_epsg):
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+            # 加载过程持有锁，避免并发请求重复读取同一个栅格
+            start = time.perf_counter()
+            dem_data = load_dem_data(key, utm_epsg=utm_epsg)
+            dem_data = dem_data.model_copy(
+                update={"identity": (key, mtime, dem_data.utm_epsg)}
+            )
+            elapsed = time.perf_counter() - start
+
+            dem_data.data.setflags(write=False)
+            self._entries[key] = (mtime, utm_epsg, dem_data)
+            self.loads += 1
+            self.last_load_time = elapsed
+            self.total_load_time += elapsed
+            return dem_data
+
+    def invalidate(self, dem_file_path: str | Path | None = None):
+        """清除指定路径（或全部）的缓存"""
+        with self._lock:
+            if dem_file_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._key(dem_file_path), None)
+
+    def stats(self) -> dict:
+        """返回缓存统计信息"""
+        with self._lock:
+            return {
+                "cached_files": list(self._entries.keys()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "last_load_time": self.last_load_time,
+                "total_load_time": self.total_load_time,
+            }
+
+
+dem_registry = DEMRegistry()
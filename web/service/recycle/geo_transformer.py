@@ -1,12 +1,28 @@
 import numpy as np
+from functools import lru_cache
 from typing import Tuple
 from pyproj import Transformer
 
 
+DEFAULT_UTM_EPSG = 32650
+
+
+def utm_epsg_for(lon: float, lat: float) -> int:
+    """根据经纬度计算所在 UTM 分带的 EPSG 代码（北半球 326xx，南半球 327xx）"""
+    zone = int((lon + 180) // 6) + 1
+    zone = min(max(zone, 1), 60)
+    return (32600 if lat >= 0 else 32700) + zone
+
+
 class GeoCoordTransformer:
-    def __init__(self):
-        self.to_utm = Transformer.from_crs("epsg:4326", "epsg:32650", always_xy=True)
-        self.to_wgs84 = Transformer.from_crs("epsg:32650", "epsg:4326", always_xy=True)
+    def __init__(self, utm_epsg: int = DEFAULT_UTM_EPSG):
+        self.utm_epsg = utm_epsg
+        self.to_utm = Transformer.from_crs(
+            "epsg:4326", f"epsg:{utm_epsg}", always_xy=True
+        )
+        self.to_wgs84 = Transformer.from_crs(
+            f"epsg:{utm_epsg}", "epsg:4326", always_xy=True
+        )
 
     def wgs84_to_utm(
         self, lon: float, lat: float
@@ -32,5 +48,36 @@ class GeoCoordTransformer:
             print(f"坐标转换失败: {str(e)}")
             raise e
 
+    def wgs84_to_utm_array(self, lon, lat) -> Tuple[np.ndarray, np.ndarray]:
+        """批量转换经纬度数组到 UTM，无法转换的坐标返回 NaN"""
+        easting, northing = self.to_utm.transform(
+            np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+        )
+        return _finite_or_nan(easting), _finite_or_nan(northing)
+
+    def utm_to_wgs84_array(self, easting, northing) -> Tuple[np.ndarray, np.ndarray]:
+        """批量转换 UTM 坐标数组到经纬度，无法转换的坐标返回 NaN"""
+        lon, lat = self.to_wgs84.transform(
+            np.asarray(easting, dtype=np.float64),
+            np.asarray(northing, dtype=np.float64),
+        )
+        return _finite_or_nan(lon), _finite_or_nan(lat)
+
+
+def _finite_or_nan(values) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isfinite(values), values, np.nan)
+
+
+@lru_cache(maxsize=None)
+def get_geo_transformer(utm_epsg: int = DEFAULT_UTM_EPSG) -> GeoCoordTransformer:
+    """按 UTM 分带缓存的坐标转换器"""
+    return GeoCoordTransformer(utm_epsg)
+
+
+def geo_transformer_for_location(lon: float, lat: float) -> GeoCoordTransformer:
+    """获取经纬度所在 UTM 分带的坐标转换器"""
+    return get_geo_transformer(utm_epsg_for(lon, lat))
+
 
-geo_transformer = GeoCoordTransformer()
+geo_transformer = get_geo_transformer(DEFAULT_UTM_EPSG)
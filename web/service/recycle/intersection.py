@@ -0,0 +1,179 @@
+import math
+import numpy as np
+
+from typing import Sequence, Tuple
+
+from service.recycle.dem_sampler import DEMSampler
+from service.recycle.schema import DEMData
+
+
+def terrain_height(dem_data: DEMData, easting, northing) -> np.ndarray:
+    """
+    批量获取 UTM 坐标处的 DEM 海拔，超出 DEM 范围的位置返回 NaN。
+    """
+    easting = np.asarray(easting, dtype=np.float64)
+    northing = np.asarray(northing, dtype=np.float64)
+    heights = DEMSampler(dem_data).sample(
+        np.column_stack([easting.ravel(), northing.ravel()]), coord_type="utm"
+    )
+    return heights.reshape(easting.shape)
+
+
+def _ray_clearance(origins, directions, t, dem_data, clearance):
+    """
+    计算射线在距离 t 处的高度与地形高度之差（减去容差高度）。
+
+    origins/directions 形状为 (N, 3)，t 形状为 (N, S)，返回 (N, S)。
+    """
+    pos = origins[:, None, :] + t[:, :, None] * directions[:, None, :]
+    heights = terrain_height(dem_data, pos[..., 0], pos[..., 1])
+    return pos[..., 2] - heights - clearance
+
+
+def _march(
+    origins, directions, start, stop, step, dem_data, min_dist, clearance, max_samples
+):
+    """
+    在每条射线的 [start, stop] 区间内以固定步长批量采样，
+    找到第一个位于地形之下的采样点，返回其所在的区间。
+
+    返回 (hit, lo, hi, bracketed)：
+      hit -- 是否找到交点
+      lo, hi -- 交点所在区间，hi 处射线已位于地形之下
+      bracketed -- lo 处射线是否位于地形之上（即区间内存在符号变化）
+    """
+    n = len(origins)
+    hit = np.zeros(n, dtype=bool)
+    bracketed = np.zeros(n, dtype=bool)
+    lo = np.full(n, np.nan)
+    hi = np.full(n, np.nan)
+    if n == 0:
+        return hit, lo, hi, bracketed
+
+    counts = np.ceil((stop - start) / step - 1e-9).astype(np.int64) + 1
+    n_samples = int(counts.max())
+    sample_index = np.arange(n_samples)
+    chunk = max(1, max_samples // n_samples)
+
+    for begin in range(0, n, chunk):
+        sl = slice(begin, begin + chunk)
+        t = np.minimum(
+            start[sl, None] + sample_index[None, :] * step, stop[sl, None]
+        )
+        valid = sample_index[None, :] < counts[sl, None]
+        g = _ray_clearance(origins[sl], directions[sl], t, dem_data, clearance)
+
+        out = np.isnan(g) & valid
+        below = (g <= 0) & valid & (t >= min_dist)
+        first_out = np.where(out.any(axis=1), out.argmax(axis=1), n_samples)
+        first_hit = np.where(below.any(axis=1), below.argmax(axis=1), n_samples)
+
+        rows = np.nonzero(first_hit < first_out)[0]
+        k = first_hit[rows]
+        prev = np.maximum(k - 1, 0)
+        has_bracket = (k > 0) & (g[rows, prev] > 0)
+
+        idx = begin + rows
+        hit[idx] = True
+        hi[idx] = t[rows, k]
+        lo[idx] = np.where(has_bracket, t[rows, prev], t[rows, k])
+        bracketed[idx] = has_bracket
+
+    return hit, lo, hi, bracketed
+
+
+def ray_intersect_dem_batch(
+    ray_origins,
+    ray_directions,
+    dem_data: DEMData,
+    max_search_dist: float = 5000,
+    step: float = 1,
+    step_schedule: Sequence[float] | None = None,
+    min_search_dist: float = 50,
+    clearance: float = 0.5,
+    tolerance: float = 0.01,
+    max_samples: int = 2_000_000,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量计算射线与 DEM 的交点。
+
+    先以批量 NumPy 运算沿射线采样，找到射线高度与地形高度之差的第一个符号变化，
+    再用二分法把交点细化到 tolerance 以内。
+
+    参数:
+      ray_origins -- 射线起点 (N, 3)，UTM 坐标
+      ray_directions -- 射线方向 (N, 3)，单位向量
+      dem_data -- DEM 数据
+      max_search_dist -- 最大搜索距离（米）
+      step -- 采样步长（米），未指定 step_schedule 时使用
+      step_schedule -- 由粗到细的步长序列，例如 (16, 4, 1)；
+        每一级只在上一级找到的区间内重新采样
+      min_search_dist -- 忽略距离相机过近的交点（米）
+      clearance -- 射线低于地形高度加该值时视为相交（米）
+      tolerance -- 二分细化的距离精度（米）
+      max_samples -- 单次批量采样的最大点数，用于限制内存
+
+    返回:
+      (points, distances) 其中 points 为 (N, 3) 交点，distances 为 (N,) 沿射线的距离；
+      未找到交点（或射线先离开 DEM 范围）的射线对应 NaN
+    """
+    origins = np.asarray(ray_origins, dtype=np.float64).reshape(-1, 3)
+    directions = np.asarray(ray_directions, dtype=np.float64).reshape(-1, 3)
+    n = len(origins)
+
+    steps = list(step_schedule) if step_schedule else [step]
+    first_step = steps[0]
+
+    # 与逐步推进一致：采样点为 0, step, 2*step, ...，不超过 max_search_dist
+    start = np.zeros(n)
+    stop = np.full(n, (int(max_search_dist / first_step) - 1) * first_step)
+    active = np.arange(n)
+
+    hit = np.zeros(n, dtype=bool)
+    lo = np.full(n, np.nan)
+    hi = np.full(n, np.nan)
+    bracketed = np.zeros(n, dtype=bool)
+
+    for level, current_step in enumerate(steps):
+        sub_hit, sub_lo, sub_hi, sub_bracketed = _march(
+            origins[active],
+            directions[active],
+            start[active],
+            stop[active],
+            current_step,
+            dem_data,
+            min_search_dist,
+            clearance,
+            max_samples,
+        )
+        if level == 0:
+            hit[active] = sub_hit
+        lo[active] = np.where(sub_hit, sub_lo, lo[active])
+        hi[active] = np.where(sub_hit, sub_hi, hi[active])
+        bracketed[active] = np.where(sub_hit, sub_bracketed, False)
+
+        # 下一级只细化存在符号变化的区间
+        active = active[sub_hit & sub_bracketed]
+        start[active] = lo[active]
+        stop[active] = hi[active]
+
+    # 二分细化
+    refine = np.nonzero(bracketed)[0]
+    if len(refine):
+        a = lo[refine]
+        b = hi[refine]
+        width = float(np.max(b - a))
+        iterations = max(0, math.ceil(math.log2(width / tolerance))) if width > 0 else 0
+        for _ in range(iterations):
+            mid = (a + b) / 2
+            g = _ray_clearance(
+                origins[refine], directions[refine], mid[:, None], dem_data, clearance
+            )[:, 0]
+            below = g <= 0
+            b = np.where(below, mid, b)
+            a = np.where(below, a, mid)
+        hi[refine] = b
+
+    distances = np.where(hit, hi, np.nan)
+    points = origins + distances[:, None] * directions
+    return points, distances
@@ -1,12 +1,14 @@
 import cv2
 import numpy as np
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from scipy.optimize import minimize_scalar
 from typing import List, Tuple, Dict, Any
 
 
 ## 本身
 
-from service.recycle.geo_transformer import geo_transformer
+from service.recycle.geo_transformer import GeoCoordTransformer, geo_transformer
 from service.recycle.schema import PointData
 
 
@@ -26,16 +28,169 @@ def reprojection_point(
     tvec: np.ndarray,
 ) -> List[Tuple[float, float]]:
     projected_points, _ = cv2.projectPoints(pos3d, rvec, tvec, K, dist_coeffs)
-    projected_points = projected_points[0]
+    # projectPoints 返回 (N, 1, 2)，展平为 (N, 2) 以返回全部点
+    projected_points = projected_points.reshape(-1, 2)
     return [(float(fp[0]), float(fp[1])) for fp in projected_points]
 
 
+# 相机参数 - 使用多个值的组合
+FOCAL_LENGTHS = [90, 100, 120, 150, 180, 210, 240, 300, 360]
+SENSOR_SIZES = [(102, 127), (127, 178), (203, 254)]
+
+
+def evaluate_camera_candidate(
+    pos3d: np.ndarray,
+    pixels: np.ndarray,
+    image_width: float,
+    image_height: float,
+    focal_length: float,
+    sensor_size: Tuple[float, float],
+    dist_coeffs: np.ndarray,
+) -> Dict[str, Any] | None:
+    """
+    使用给定的焦距和传感器尺寸求解相机姿态，返回参数及平均重投影误差，求解失败时返回 None。
+    """
+    sensor_width, sensor_height = sensor_size
+    try:
+        # 计算像素大小
+        pixel_size_width = sensor_width / image_width
+        pixel_size_height = sensor_height / image_height
+
+        # 构建相机内参矩阵K
+        fx = focal_length / pixel_size_width
+        fy = focal_length / pixel_size_height
+
+        K = np.array(
+            [
+                [fx, 0, image_width / 2],
+                [0, fy, image_height / 2],
+                [0, 0, 1],
+            ],
+            dtype=np.float32,
+        )
+
+        # 使用EPNP算法进行相机姿态估计
+        success, initial_rotation_vector, initial_translation_vector = cv2.solvePnP(
+            pos3d, pixels, K, dist_coeffs, flags=cv2.SOLVEPNP_EPNP
+        )
+
+        if not success:
+            return None
+
+        # 优化旋转向量和平移向量
+        optimized_rotation_vector, optimized_translation_vector = (
+            cv2.solvePnPRefineLM(
+                pos3d,
+                pixels,
+                K,
+                dist_coeffs,
+                initial_rotation_vector,
+                initial_translation_vector,
+            )
+        )
+
+        # 计算重投影误差
+        errors_optimized = compute_reprojection_error(
+            pos3d,
+            pixels,
+            K,
+            dist_coeffs,
+            optimized_rotation_vector,
+            optimized_translation_vector,
+        )
+        R_matrix, _ = cv2.Rodrigues(optimized_rotation_vector)
+
+        return {
+            "mean_error": float(np.mean(errors_optimized)),
+            "focal_length": focal_length,
+            "sensor_width": sensor_width,
+            "sensor_height": sensor_height,
+            "K": K,
+            "R": R_matrix,
+            "dist_coeffs": dist_coeffs,
+            "optimized_rotation_vector": optimized_rotation_vector,
+            "optimized_translation_vector": optimized_translation_vector,
+        }
+    except Exception as e:
+        print(
+            f"参数组合 {focal_length}mm, {sensor_width}x{sensor_height}mm 计算失败: {str(e)}"
+        )
+        return None
+
+
+def refine_focal_length(
+    pos3d: np.ndarray,
+    pixels: np.ndarray,
+    image_width: float,
+    image_height: float,
+    sensor_size: Tuple[float, float],
+    bounds: Tuple[float, float],
+    dist_coeffs: np.ndarray,
+    xatol: float = 0.1,
+) -> Dict[str, Any] | None:
+    """
+    在 bounds 区间内对焦距做一维连续优化，使平均重投影误差最小。
+    """
+
+    def objective(focal_length: float) -> float:
+        candidate = evaluate_camera_candidate(
+            pos3d,
+            pixels,
+            image_width,
+            image_height,
+            focal_length,
+            sensor_size,
+            dist_coeffs,
+        )
+        return candidate["mean_error"] if candidate else float("inf")
+
+    result = minimize_scalar(
+        objective, bounds=bounds, method="bounded", options={"xatol": xatol}
+    )
+    return evaluate_camera_candidate(
+        pos3d,
+        pixels,
+        image_width,
+        image_height,
+        float(result.x),
+        sensor_size,
+        dist_coeffs,
+    )
+
+
+def _map_candidates(fn, tasks: List[tuple], executor: str, workers: int | None):
+    """按指定模式（serial/thread/process）并行计算候选参数"""
+    if executor == "serial" or len(tasks) <= 1:
+        return [fn(*task) for task in tasks]
+    if executor == "thread":
+        pool = ThreadPoolExecutor(max_workers=workers)
+    elif executor == "process":
+        pool = ProcessPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"未知的求解模式: {executor}")
+    with pool:
+        return list(pool.map(fn, *zip(*tasks)))
+
+
 # EPNP算法计算相机位置 - 多次计算并选择重投影误差最小的解
 def EPNP_calculate(
     point_data: List[PointData],
+    executor: str = "serial",
+    workers: int | None = None,
+    refine_focal: bool = False,
+    prune_ratio: float = 2.0,
+    transformer: GeoCoordTransformer = geo_transformer,
 ) -> Tuple[
     Tuple[float, float, float], float, Tuple[int, int], float, Dict[str, Any]
 ]:  # 相机位置（经度，纬度，高程），焦距，传感器尺寸，重投影误差，相机参数
+    """
+    参数:
+      executor -- 候选参数的计算方式：serial（串行）、thread（线程池）或 process（进程池）
+      workers -- 线程池/进程池的工作数量，None 时使用默认值
+      refine_focal -- 是否在网格搜索后对焦距做连续优化
+      prune_ratio -- 连续优化时仅保留网格最优误差不超过全局最优误差该倍数的传感器尺寸
+      transformer -- 与 point_data 中 UTM 坐标同一分带的坐标转换器
+    """
     # 从point_data中提取3D点和2D像素点
     pos3d = np.array([rec.pos3d for rec in point_data], dtype=np.float64).reshape(-1, 3)
     pixels = np.array([rec.pixel for rec in point_data], dtype=np.float64).reshape(
@@ -54,112 +209,85 @@ def EPNP_calculate(
     image_width = np.max(pixels[:, 0]) if len(pixels) > 0 else 1920
     image_height = np.max(pixels[:, 1]) if len(pixels) > 0 else 1080
 
-    # 相机参数 - 使用多个值的组合
-    focal_lengths = [90, 100, 120, 150, 180, 210, 240, 300, 360]
-    sensor_sizes = [(102, 127), (127, 178), (203, 254)]
-
     # 初始化畸变系数为0
     dist_coeffs = np.zeros((4, 1), dtype=np.float64)
 
-    print("开始EPNP计算，遍历所有相机参数组合")
-
-    best_mean_error = float("inf")
-    best_params = None
-    best_camera_origin = np.zeros((3, 1), dtype=np.float64)
-    best_focal_length = None
-    best_sensor_size = None
+    print(f"开始EPNP计算，遍历所有相机参数组合（模式: {executor}）")
 
     try:
         # 遍历所有可能的相机参数组合
-        for focal_length in focal_lengths:
-            for sensor_width, sensor_height in sensor_sizes:
-                try:
-                    # 计算像素大小
-                    pixel_size_width = sensor_width / image_width
-                    pixel_size_height = sensor_height / image_height
-
-                    # 构建相机内参矩阵K
-                    fx = focal_length / pixel_size_width
-                    fy = focal_length / pixel_size_height
-
-                    K = np.array(
-                        [
-                            [fx, 0, image_width / 2],
-                            [0, fy, image_height / 2],
-                            [0, 0, 1],
-                        ],
-                        dtype=np.float32,
-                    )
-
-                    # 使用EPNP算法进行相机姿态估计
-                    success, initial_rotation_vector, initial_translation_vector = (
-                        cv2.solvePnP(
-                            pos3d, pixels, K, dist_coeffs, flags=cv2.SOLVEPNP_EPNP
-                        )
-                    )
-
-                    if not success:
-                        continue  # 如果求解失败，跳过当前参数组合
-
-                    # 优化旋转向量和平移向量
-                    optimized_rotation_vector, optimized_translation_vector = (
-                        cv2.solvePnPRefineLM(
-                            pos3d,
-                            pixels,
-                            K,
-                            dist_coeffs,
-                            initial_rotation_vector,
-                            initial_translation_vector,
-                        )
-                    )
+        tasks = [
+            (
+                pos3d,
+                pixels,
+                image_width,
+                image_height,
+                focal_length,
+                sensor_size,
+                dist_coeffs,
+            )
+            for focal_length in FOCAL_LENGTHS
+            for sensor_size in SENSOR_SIZES
+        ]
+        candidates = [
+            candidate
+            for candidate in _map_candidates(
+                evaluate_camera_candidate, tasks, executor, workers
+            )
+            if candidate is not None
+        ]
+        if not candidates:
+            raise RuntimeError("所有参数组合都求解失败")
 
-                    # 计算重投影误差
-                    errors_optimized = compute_reprojection_error(
+        if refine_focal:
+            # 每个传感器尺寸取网格最优焦距，在相邻焦距之间做连续优化
+            best_error = min(c["mean_error"] for c in candidates)
+            refine_tasks = []
+            for sensor_size in SENSOR_SIZES:
+                sensor_candidates = [
+                    c
+                    for c in candidates
+                    if (c["sensor_width"], c["sensor_height"]) == sensor_size
+                ]
+                if not sensor_candidates:
+                    continue
+                best = min(sensor_candidates, key=lambda c: c["mean_error"])
+                if best["mean_error"] > best_error * prune_ratio:
+                    continue
+                index = FOCAL_LENGTHS.index(best["focal_length"])
+                bounds = (
+                    FOCAL_LENGTHS[max(index - 1, 0)],
+                    FOCAL_LENGTHS[min(index + 1, len(FOCAL_LENGTHS) - 1)],
+                )
+                refine_tasks.append(
+                    (
                         pos3d,
                         pixels,
-                        K,
+                        image_width,
+                        image_height,
+                        sensor_size,
+                        bounds,
                         dist_coeffs,
-                        optimized_rotation_vector,
-                        optimized_translation_vector,
-                    )
-                    mean_error_optimized = np.mean(errors_optimized)
-
-                    # 如果当前组合的误差更小，更新最优解
-                    if mean_error_optimized < best_mean_error:
-                        best_mean_error = mean_error_optimized
-
-                        # 计算相机原点位置
-                        R_matrix, _ = cv2.Rodrigues(optimized_rotation_vector)
-                        camera_origin = (
-                            -R_matrix.T @ optimized_translation_vector.flatten()
-                        )
-                        best_camera_origin = camera_origin
-                        best_focal_length = focal_length
-                        best_sensor_size = (sensor_width, sensor_height)
-
-                        # 准备参数
-                        best_params = {
-                            "focal_length": focal_length,
-                            "sensor_width": sensor_width,
-                            "sensor_height": sensor_height,
-                            "K": K,
-                            "R": R_matrix,
-                            "dist_coeffs": dist_coeffs,
-                            "optimized_rotation_vector": optimized_rotation_vector,
-                            "optimized_translation_vector": optimized_translation_vector,
-                        }
-
-                        print(
-                            f"找到更优参数组合 - 焦距: {focal_length}mm, 传感器尺寸: {sensor_width}x{sensor_height}mm, 重投影误差: {mean_error_optimized:.2f} pixels"
-                        )
-                except Exception as e:
-                    print(
-                        f"参数组合 {focal_length}mm, {sensor_width}x{sensor_height}mm 计算失败: {str(e)}"
                     )
-                    continue
+                )
+            candidates += [
+                candidate
+                for candidate in _map_candidates(
+                    refine_focal_length, refine_tasks, executor, workers
+                )
+                if candidate is not None
+            ]
+
+        best_params = min(candidates, key=lambda c: c["mean_error"])
+        best_mean_error = best_params.pop("mean_error")
+        best_focal_length = best_params["focal_length"]
+        best_sensor_size = (best_params["sensor_width"], best_params["sensor_height"])
+
+        # 计算相机原点位置
+        best_camera_origin = (
+            -best_params["R"].T @ best_params["optimized_translation_vector"].flatten()
+        )
 
-        if best_params is None:
-            raise RuntimeError("所有参数组合都求解失败")
         if not best_camera_origin.any():
             raise RuntimeError("相机原点计算失败")
         if not best_focal_length:
@@ -168,7 +296,7 @@ def EPNP_calculate(
             raise RuntimeError("传感器尺寸计算失败")
 
         # 将相机原点位置从UTM坐标系转换为WGS84坐标系
-        lon, lat = geo_transformer.utm_to_wgs84(
+        lon, lat = transformer.utm_to_wgs84(
             best_camera_origin[0], best_camera_origin[1]
         )
         height = best_camera_origin[2]
@@ -0,0 +1,83 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def face_normals(vertices, faces) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量计算三角面的单位法向量和面积。
+
+    参数:
+      vertices -- 顶点坐标 (V, 3)
+      faces -- 三角面顶点索引 (F, 3)
+
+    返回:
+      (normals, areas) 其中 normals 为 (F, 3)，areas 为 (F,)；
+      退化三角面（面积为 0）的法向量为 0 向量
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+
+    p1 = vertices[faces[:, 0]]
+    cross = np.cross(vertices[faces[:, 1]] - p1, vertices[faces[:, 2]] - p1)
+    norms = np.linalg.norm(cross, axis=1)
+
+    normals = np.zeros_like(cross)
+    valid = norms > 0
+    normals[valid] = cross[valid] / norms[valid, None]
+    return normals, norms / 2
+
+
+def filter_faces(
+    vertices, faces, min_normal_z: float = 0.1, min_area: float = 1e-9
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    删除退化三角面和不必要的立面（法向量接近水平，即面接近垂直的三角面）。
+
+    参数:
+      min_normal_z -- 法向量 z 分量绝对值的下限，0.1 约对应 84° 的坡度
+      min_area -- 面积下限，小于该值的三角面视为退化
+
+    返回:
+      (faces, normals) 保留的三角面及其单位法向量
+    """
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    normals, areas = face_normals(vertices, faces)
+    keep = (areas > min_area) & (np.abs(normals[:, 2]) > min_normal_z)
+    return faces[keep], normals[keep]
+
+
+def vertex_normals(vertices, faces) -> np.ndarray:
+    """
+    按面积加权累加相邻三角面的法向量，得到 (V, 3) 的单位顶点法向量。
+    三角面需要朝向一致（见 orient_faces_up），不属于任何三角面的顶点法向量为 0 向量。
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+
+    # 未归一化的叉积长度为面积的两倍，直接累加即为面积加权
+    p1 = vertices[faces[:, 0]]
+    cross = np.cross(vertices[faces[:, 1]] - p1, vertices[faces[:, 2]] - p1)
+
+    corners = faces.ravel()
+    accumulated = np.column_stack(
+        [
+            np.bincount(corners, np.repeat(cross[:, axis], 3), len(vertices))
+            for axis in range(3)
+        ]
+    )
+
+    norms = np.linalg.norm(accumulated, axis=1)
+    result = np.zeros_like(accumulated)
+    valid = norms > 0
+    result[valid] = accumulated[valid] / norms[valid, None]
+    return result
+
+
+def orient_faces_up(vertices, faces) -> np.ndarray:
+    """翻转法向量朝下的三角面，使地形网格的法向量统一朝上"""
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3).copy()
+    normals, _ = face_normals(vertices, faces)
+    down = normals[:, 2] < 0
+    faces[down] = faces[down][:, [0, 2, 1]]
+    return faces
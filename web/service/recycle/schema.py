@@ -45,8 +45,17 @@ class DEMData(BaseModel):
         ..., description="地形数据在UTM坐标系中的Y轴范围"
     )
     data: np.ndarray = Field(..., description="地形数据数组")
+    geotransform: Tuple[float, float, float, float, float, float] | None = Field(
+        None, description="DEM 栅格的地理变换参数（GDAL GeoTransform）"
+    )
+    utm_epsg: int = Field(32650, description="DEM 所在区域使用的 UTM 分带 EPSG 代码")
+    identity: Tuple[str, int, int] | None = Field(
+        None,
+        description="DEM 文件标识（路径，修改时间，UTM 分带），由 dem_registry 填写",
+    )
 
-    model_config = ConfigDict(arbitrary_types_allowed=True)  # 添加配置项
+    # DEM 数据在进程内共享缓存，构造后不可修改
+    model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
 
 
 class PointData(BaseModel):
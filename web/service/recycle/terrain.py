@@ -0,0 +1,103 @@
+import math
+
+from typing import Tuple
+
+import numpy as np
+import shapely
+from scipy.spatial import Delaunay
+from shapely.geometry import MultiPoint
+from shapely.geometry.base import BaseGeometry
+
+from service.recycle.dem_sampler import DEMSampler
+from service.recycle.geo_transformer import get_geo_transformer
+from service.recycle.mesh import filter_faces, orient_faces_up, vertex_normals
+from service.recycle.schema import DEMData
+
+
+def _window(origin: float, step: float, lo: float, hi: float, size: int):
+    """计算坐标区间 [lo, hi] 覆盖的栅格索引范围，超出栅格时返回 None"""
+    first, last = sorted(((lo - origin) / step, (hi - origin) / step))
+    start = max(math.ceil(first), 0)
+    stop = min(math.floor(last), size - 1)
+    if start > stop:
+        return None
+    return start, stop
+
+
+def clip_dem_to_polygon(
+    dem_data: DEMData, polygon: BaseGeometry, stride: int = 1
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    提取落在多边形内部的 DEM 格点。
+
+    先按多边形外包框裁剪出 DEM 窗口，再用 shapely.contains_xy 对整个窗口
+    一次性计算掩膜。格点坐标与 DEMData 插值器一致，即 data[row, col]
+    位于 (x_origin + col * x_step, y_origin + row * y_step)。
+
+    参数:
+      dem_data -- DEM 数据
+      polygon -- WGS84 经纬度下的多边形
+      stride -- 格点抽稀间隔，1 表示使用全部格点
+
+    返回:
+      (longitudes, latitudes, elevations) 三个一维数组
+    """
+    if not polygon.is_valid:
+        polygon = polygon.buffer(0)
+
+    empty = np.empty(0, dtype=np.float64)
+    if polygon.is_empty:
+        return empty, empty, empty
+
+    sampler = DEMSampler(dem_data)
+    rows, cols = dem_data.data.shape
+    min_lon, min_lat, max_lon, max_lat = polygon.bounds
+    col_window = _window(sampler.x_origin, sampler.x_step, min_lon, max_lon, cols)
+    row_window = _window(sampler.y_origin, sampler.y_step, min_lat, max_lat, rows)
+    if col_window is None or row_window is None:
+        return empty, empty, empty
+
+    col_index = np.arange(col_window[0], col_window[1] + 1, stride)
+    row_index = np.arange(row_window[0], row_window[1] + 1, stride)
+    lon, lat = np.meshgrid(
+        sampler.x_origin + col_index * sampler.x_step,
+        sampler.y_origin + row_index * sampler.y_step,
+    )
+
+    shapely.prepare(polygon)
+    mask = shapely.contains_xy(polygon, lon, lat)
+    window = dem_data.data[np.ix_(row_index, col_index)]
+    return lon[mask], lat[mask], window[mask].astype(np.float64)
+
+
+def build_terrain_mesh(
+    dem_data: DEMData, boundary_lonlat, stride: int = 1
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    根据地理化边界点重建地形网格：凸包 → DEM 裁剪 → UTM → Delaunay → 去除立面。
+
+    参数:
+      dem_data -- DEM 数据
+      boundary_lonlat -- 边界点经纬度 (N, 2)
+      stride -- DEM 格点抽稀间隔
+
+    返回:
+      (vertices, faces, normals) 其中 vertices 为 (V, 3) UTM 坐标，
+      faces 为 (F, 3) 顶点索引（法向量朝上），normals 为 (V, 3) 顶点法向量
+    """
+    boundary_lonlat = np.asarray(boundary_lonlat, dtype=np.float64).reshape(-1, 2)
+    hull = MultiPoint(boundary_lonlat).convex_hull
+    if hull.geom_type != "Polygon":
+        raise ValueError("边界点不足以构成多边形")
+
+    lon, lat, elevations = clip_dem_to_polygon(dem_data, hull, stride)
+    if len(lon) < 3:
+        raise ValueError("边界范围内的高程点不足")
+
+    eastings, northings = get_geo_transformer(dem_data.utm_epsg).wgs84_to_utm_array(
+        lon, lat
+    )
+    vertices = np.column_stack([eastings, northings, elevations])
+    triangles = Delaunay(vertices[:, :2]).simplices
+    faces, _ = filter_faces(vertices, orient_faces_up(vertices, triangles))
+    return vertices, faces, vertex_normals(vertices, faces)
@@ -2,16 +2,23 @@ import math
 import numpy as np
 
 from scipy.interpolate import RegularGridInterpolator
-from osgeo import gdal
 
+from sqlalchemy import Select, select
 from sqlalchemy.orm import Session
 
 from typing import List
 
 ##
-from service.recycle.geo_transformer import geo_transformer
+from service.recycle.geo_transformer import (
+    geo_transformer,
+    get_geo_transformer,
+    utm_epsg_for,
+)
+from service.recycle.dem_sampler import DEMSampler
+from service.recycle.intersection import ray_intersect_dem_batch
 from service.recycle.schema import Feature, DEMData, PointData
 
+from model.building_point import BuildingPoint as ORMBuildingPoint
 from model.feature import Feature as ORMFeature
 
 
@@ -41,10 +48,14 @@ def calc_bearing(x1: float, y1: float, x2: float, y2: float) -> float:
 
 
 # 加载DEM数据
-def load_dem_data(dem_file_path: str) -> DEMData:
+def load_dem_data(dem_file_path: str, utm_epsg: int | None = None) -> DEMData:
     """
     加载 DEM 文件，并返回一个包含 DEM 数据和地理变换信息的字典。
+    utm_epsg 为空时根据 DEM 中心位置自动选择 UTM 分带。
     """
+    # GDAL 只在加载 DEM 时需要，延迟导入使其余模块（及测试）不依赖 GDAL
+    from osgeo import gdal
+
     dem_dataset = gdal.Open(dem_file_path)
     if dem_dataset is None:
         raise RuntimeError(f"无法加载 DEM 文件: {dem_file_path}")
@@ -54,6 +65,12 @@ def load_dem_data(dem_file_path: str) -> DEMData:
     dem_x = np.arange(dem_array.shape[1]) * gt[1] + gt[0]
     dem_y = np.arange(dem_array.shape[0]) * gt[5] + gt[3]
 
+    if utm_epsg is None:
+        utm_epsg = utm_epsg_for(
+            (dem_x.min() + dem_x.max()) / 2, (dem_y.min() + dem_y.max()) / 2
+        )
+    transformer = get_geo_transformer(utm_epsg)
+
     # 新增部分：计算 DEM 四角点在 UTM 下的坐标范围
     corners = [
         (dem_x.min(), dem_y.min()),
@@ -65,7 +82,7 @@ def load_dem_data(dem_file_path: str) -> DEMData:
     utm_y_list = []
     for lon, lat in corners:
         try:
-            easting, northing = geo_transformer.wgs84_to_utm(lon, lat)
+            easting, northing = transformer.wgs84_to_utm(lon, lat)
             utm_x_list.append(easting)
             utm_y_list.append(northing)
         except Exception as e:
@@ -83,39 +100,71 @@ def load_dem_data(dem_file_path: str) -> DEMData:
         utm_x_range=dem_utm_x_range,
         utm_y_range=dem_utm_y_range,
         data=dem_array,
+        geotransform=tuple(gt),
+        utm_epsg=utm_epsg,
     )  # 验证数据格式
     print(f"DEM 范围: 经度 {dem_data.x_range}, 纬度 {dem_data.y_range}")
+    print(f"DEM UTM 分带: EPSG:{utm_epsg}")
     print(f"DEM UTM 范围: 东距 {dem_data.utm_x_range}, 北距 {dem_data.utm_y_range}")
     return dem_data
 
 
+def feature_rows_statement(img_id: int) -> Select:
+    """
+    联表查询图片的特征点及对应建筑点信息的语句，同步和异步会话共用。
+    """
+    return (
+        select(
+            ORMFeature.id,
+            ORMFeature.pixel_x,
+            ORMFeature.pixel_y,
+            ORMFeature.building_point_id,
+            ORMBuildingPoint.name,
+            ORMBuildingPoint.longitude,
+            ORMBuildingPoint.latitude,
+        )
+        .join(ORMBuildingPoint, ORMFeature.building_point_id == ORMBuildingPoint.id)
+        .where(ORMFeature.image_id == img_id)
+        .order_by(ORMFeature.id)
+    )
+
+
+def load_feature_rows(img_id: int, db: Session) -> list:
+    """
+    一次联表查询加载图片的特征点及对应建筑点信息，返回轻量的行元组，
+    避免逐个特征点访问 building_point 触发额外查询。
+    """
+    return db.execute(feature_rows_statement(img_id)).all()
+
+
+def features_from_rows(rows: list) -> List[Feature]:
+    """将 load_feature_rows 返回的行转换为 Feature 列表"""
+    return [
+        Feature(
+            object_id=row.id,
+            pixel_x=row.pixel_x,
+            pixel_y=row.pixel_y,
+            symbol=row.name,
+            name=row.name,
+            height=4,
+            longitude=row.longitude,
+            latitude=row.latitude,
+            elevation=None,
+        )
+        for row in rows
+    ]
+
+
 def load_features_from_orm(img_id: int, db: Session) -> List[Feature]:
     """
     从 ORM 中加载特征数据，并返回一个包含特征信息的列表。
     """
+    rows = load_feature_rows(img_id, db)
 
-    features = db.query(ORMFeature).filter(ORMFeature.image_id == img_id).all()
-
-    if not features:
+    if not rows:
         raise ValueError(f"没有找到与图片 ID {img_id} 相关的特征点。")
 
-    r_feature = []
-    for feature in features:
-        r_feature.append(
-            Feature(
-                object_id=feature.id,
-                pixel_x=feature.pixel_x,
-                pixel_y=feature.pixel_y,
-                symbol=feature.building_point.name,
-                name=feature.building_point.name,
-                height=4,
-                longitude=feature.building_point.longitude,
-                latitude=feature.building_point.latitude,
-                elevation=None,
-            )
-        )
-
-    return r_feature
+    return features_from_rows(rows)
 
 
 def load_points_data_from_orm(
@@ -124,19 +173,33 @@ def load_points_data_from_orm(
     """
     从 ORM 中加载点数据，并返回一个包含点信息的列表。
     """
+    # 跳过当前处理照片中像素坐标为0,0的点
+    features = [
+        feature
+        for feature in features
+        if not (int(feature.pixel_x) == 0 and int(feature.pixel_y) == 0)
+    ]
+    if not features:
+        return []
+
+    lonlat = np.array(
+        [(float(feature.longitude), float(feature.latitude)) for feature in features],
+        dtype=np.float64,
+    )
+    elevations = DEMSampler(dem_data).sample(lonlat, coord_type="wgs84")
+    outside = [feature.name for feature, elev in zip(features, elevations) if np.isnan(elev)]
+    if outside:
+        raise ValueError(f"特征点超出DEM范围: {', '.join(outside)}")
+
+    eastings, northings = get_geo_transformer(dem_data.utm_epsg).wgs84_to_utm_array(
+        lonlat[:, 0], lonlat[:, 1]
+    )
+
     recs = []
-    for feature in features:
+    for feature, easting, northing, elevation in zip(
+        features, eastings, northings, elevations
+    ):
         pixel = np.array([int(feature.pixel_x), int(feature.pixel_y)])
-        longitude = float(feature.longitude)
-        latitude = float(feature.latitude)
-        elevation = get_dem_elevation(
-            dem_data, (longitude, latitude), coord_type="wgs84"
-        )
-        # 跳过当前处理照片中像素坐标为0,0的点
-        if int(feature.pixel_x) == 0 and int(feature.pixel_y) == 0:
-            continue
-
-        easting, northing = geo_transformer.wgs84_to_utm(longitude, latitude)
         pos3d = np.array([easting, northing, elevation])
         rec = PointData(
             pixel=pixel, symbol=feature.symbol, name=feature.name, pos3d=pos3d
@@ -154,15 +217,9 @@ def get_dem_elevation(dem_data: DEMData, coord, coord_type="utm"):
     :param coord_type: 坐标类型，'utm' 或 'wgs84'
     :return: 海拔高度
     """
-    if coord_type == "utm":
-        lon, lat = geo_transformer.utm_to_wgs84(coord[0], coord[1])
-    elif coord_type == "wgs84":
-        lon, lat = coord
-    else:
-        raise ValueError("Invalid coord_type. Must be 'utm' or 'wgs84'.")
-
-    # 插值器构造时使用的坐标顺序为 (lat, lon)
-    dem_elev = dem_data.interpolator((lat, lon))
+    dem_elev = DEMSampler(dem_data).sample([coord], coord_type=coord_type)[0]
+    if np.isnan(dem_elev):
+        raise ValueError(f"坐标 {tuple(coord)} 超出DEM范围")
     return dem_elev
 
 
@@ -174,7 +231,9 @@ def reprojection_to_pixel(
     M,
 ):
     elevation = get_dem_elevation(dem_data, (longitude, latitude), coord_type="wgs84")
-    easting, northing = geo_transformer.wgs84_to_utm(longitude, latitude)
+    easting, northing = get_geo_transformer(dem_data.utm_epsg).wgs84_to_utm(
+        longitude, latitude
+    )
     camera_easting, camera_northing, camera_elevation = camera_location
     relative_easting = easting - camera_easting
     relative_northing = northing - camera_northing
@@ -280,43 +339,24 @@ def weighted_average_optimization_factors(factors, weights):
 
 
 def ray_intersect_dem(
-    ray_origin, ray_direction, dem_data, max_search_dist=5000, step=1
+    ray_origin, ray_direction, dem_data, max_search_dist=5000, step=1, **kwargs
 ):
-    current_pos = np.array(ray_origin, dtype=np.float64)
-    step_count = 0  # 初始化步进计数器
-    for _ in range(int(max_search_dist / step)):
-        print(f"【DEBUG】当前UTM坐标: {current_pos}, 当前射线方向: {ray_direction}")
-        current_easting = current_pos[0]
-        current_northing = current_pos[1]
-        lon, lat = geo_transformer.utm_to_wgs84(current_easting, current_northing)
-
-        # 添加坐标边界检查，避免在DEM数据范围外进行插值
-        if not (
-            dem_data.x_range[0] <= lon <= dem_data.x_range[1]
-            and dem_data.y_range[0] <= lat <= dem_data.y_range[1]
-        ):
-            print(f"【警告】坐标超出DEM范围: 经度={lon}, 纬度={lat}")
-            return None, step_count
-
-        try:
-            # 修复：使用点号访问属性而不是字典下标
-            dem_elev = dem_data.interpolator((lat, lon))
-        except Exception as e:
-            print(f"【错误】插值时出错: {e}")
-            return None, step_count
-        print(f"【DEBUG】DEM海拔: {dem_elev}, 当前高度: {current_pos[2]}")
-
-        if step_count >= 50 and current_pos[2] <= dem_elev + 0.5:
-            return np.array(
-                [current_easting, current_northing, current_pos[2]]
-            ), step_count
-
-        current_pos[0] += step * ray_direction[0]
-        current_pos[1] += step * ray_direction[1]
-        current_pos[2] += step * ray_direction[2]
-        step_count += 1  # 增加步进计数器
-
-    return None, step_count
+    """
+    计算单条射线与 DEM 的交点，返回 (交点, 步进步数)，未找到交点时交点为 None。
+    其余参数参见 ray_intersect_dem_batch。
+    """
+    points, distances = ray_intersect_dem_batch(
+        np.asarray(ray_origin, dtype=np.float64)[None, :],
+        np.asarray(ray_direction, dtype=np.float64)[None, :],
+        dem_data,
+        max_search_dist=max_search_dist,
+        step=step,
+        **kwargs,
+    )
+    if np.isnan(distances[0]):
+        print("【警告】射线在DEM范围内未找到交点")
+        return None, int(max_search_dist / step)
+    return points[0], int(math.ceil(distances[0] / step))
 
 
 def pixel_to_geo(pixel_coord, K, R, ray_origin, dem_data, control_points):
@@ -357,3 +397,119 @@ def pixel_to_geo(pixel_coord, K, R, ray_origin, dem_data, control_points):
     print(f"【DEBUG】射线步进总步数: {total_steps}")
 
     return geo_coord, total_steps
+
+
+def pixels_to_rays(pixels, K, R):
+    """
+    批量将像素坐标转换为UTM坐标系下的单位射线方向，pixels 形状为 (N, 2)，返回 (N, 3)。
+    """
+    pixels = np.asarray(pixels, dtype=np.float64).reshape(-1, 2)
+    pixel_homogeneous = np.column_stack([pixels, np.ones(len(pixels))])
+    camera_rays = pixel_homogeneous @ np.linalg.inv(K).T
+    camera_rays /= np.linalg.norm(camera_rays, axis=1, keepdims=True)
+    utm_rays = camera_rays @ R
+    utm_rays /= np.linalg.norm(utm_rays, axis=1, keepdims=True)
+    return utm_rays
+
+
+def calculate_weights_batch(input_pixels, control_pixels, max_weight=1, knn_weight=30):
+    """
+    calculate_weights 的批量版本，返回 (N, M) 的权重矩阵。
+    没有控制点时无法计算权重，抛出 ValueError。
+    """
+    input_pixels = np.asarray(input_pixels, dtype=np.float64).reshape(-1, 2)
+    control_pixels = np.asarray(control_pixels, dtype=np.float64).reshape(-1, 2)
+    if len(control_pixels) == 0:
+        raise ValueError("没有可用的控制点")
+    distances = np.linalg.norm(
+        input_pixels[:, None, :] - control_pixels[None, :, :], axis=2
+    )
+    with np.errstate(divide="ignore"):
+        weights = np.where(distances != 0, 1.0 / distances, 1.0)
+    weights = np.minimum(weights, max_weight)
+    nearest = np.argmin(distances, axis=1)
+    weights[np.arange(len(weights)), nearest] *= knn_weight
+    return weights
+
+
+def prepare_control_factors(control_points, K, R, ray_origin):
+    """
+    计算控制点的像素坐标和优化因子，返回 (control_pixels (M, 2), optimization_factors (M, 3))。
+    与 compute_optimization_factors 一致，跳过与相机位置重合的控制点。
+    """
+    ray_origin = np.asarray(ray_origin, dtype=np.float64)
+    control_points = [
+        cp
+        for cp in control_points
+        if np.linalg.norm(np.asarray(cp["pos3d"], dtype=np.float64) - ray_origin) != 0
+    ]
+    optimization_factors = np.array(
+        compute_optimization_factors(control_points, K, R, ray_origin),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    control_pixels = np.array(
+        [cp["pixel"] for cp in control_points], dtype=np.float64
+    ).reshape(-1, 2)
+    return control_pixels, optimization_factors
+
+
+def pixels_to_geo_with_factors(
+    pixel_coords,
+    K,
+    R,
+    ray_origin,
+    dem_data,
+    control_pixels,
+    optimization_factors,
+    **ray_kwargs,
+):
+    """
+    使用预先计算的控制点优化因子批量将像素坐标转换为UTM地理坐标。
+
+    返回:
+      (points, distances) 其中 points 为 (N, 3) UTM 交点，未找到交点时为 NaN
+    """
+    pixel_coords = np.asarray(pixel_coords, dtype=np.float64).reshape(-1, 2)
+    ray_origin = np.asarray(ray_origin, dtype=np.float64)
+
+    weights = calculate_weights_batch(pixel_coords, control_pixels)
+    weights /= weights.sum(axis=1, keepdims=True)
+    weighted_optimization_factors = weights @ optimization_factors
+
+    ray_directions = pixels_to_rays(pixel_coords, K, R) * weighted_optimization_factors
+    ray_directions /= np.linalg.norm(ray_directions, axis=1, keepdims=True)
+
+    return ray_intersect_dem_batch(
+        np.broadcast_to(ray_origin, ray_directions.shape),
+        ray_directions,
+        dem_data,
+        **ray_kwargs,
+    )
+
+
+def pixels_to_geo_batch(
+    pixel_coords, K, R, ray_origin, dem_data, control_points, **ray_kwargs
+):
+    """
+    pixel_to_geo 的批量版本。
+
+    参数:
+      pixel_coords -- 像素坐标 (N, 2)
+      ray_kwargs -- 传递给 ray_intersect_dem_batch 的射线求交参数
+
+    返回:
+      (points, distances) 其中 points 为 (N, 3) UTM 交点，未找到交点时为 NaN
+    """
+    control_pixels, optimization_factors = prepare_control_factors(
+        control_points, K, R, ray_origin
+    )
+    return pixels_to_geo_with_factors(
+        pixel_coords,
+        K,
+        R,
+        ray_origin,
+        dem_data,
+        control_pixels,
+        optimization_factors,
+        **ray_kwargs,
+    )
@@ -0,0 +1,262 @@
+import threading
+
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+from sqlalchemy import select
+
+from config import CONFIG
+from database import AsyncSessionLocal
+from model.building_point import BuildingPoint as BuildingPointModel
+from service.recycle.geo_transformer import (
+    GeoCoordTransformer,
+    geo_transformer_for_location,
+    get_geo_transformer,
+)
+
+
+class BuildingPointIndex:
+    """
+    建筑点的内存空间索引。
+
+    在经纬度和 UTM 坐标上分别建 KD 树，用于外包框查询和按距离查询。
+    utm_epsg 为空时按距离查询使用查询点所在的 UTM 分带，各分带的 KD 树在首次查询时建立并缓存。
+    新增/修改的建筑点先放在待合并列表中暴力查询，删除/修改的旧记录用墓碑标记，
+    累计的变更超过 rebuild_threshold 后在内存中重建 KD 树；批量导入后整体失效，
+    下次查询前由 load_building_point_index 从数据库重新加载。
+    """
+
+    def __init__(self, utm_epsg: int | None = None, rebuild_threshold: int = 256):
+        self.utm_epsg = utm_epsg
+        self.rebuild_threshold = rebuild_threshold
+        self._lock = threading.Lock()
+        self._loaded = False
+        # 每次变更递增，用于丢弃加载期间已过时的数据库快照
+        self._version = 0
+        self._set_base([], [], np.empty((0, 2)))
+        self.rebuilds = 0
+
+    def _set_base(self, ids: List[int], names: List[str], lonlat: np.ndarray):
+        self._ids = np.asarray(ids, dtype=np.int64)
+        self._names = list(names)
+        self._lonlat = np.asarray(lonlat, dtype=np.float64).reshape(-1, 2)
+        self._lonlat_tree = cKDTree(self._lonlat) if len(self._ids) else None
+        # UTM 分带 EPSG -> (UTM 坐标, 投影有效的行号, KD 树)
+        self._utm_trees: Dict[int, Tuple[np.ndarray, np.ndarray, cKDTree | None]] = {}
+        self._position = {int(i): k for k, i in enumerate(self._ids)}
+        self._removed: set = set()
+        self._pending: Dict[int, Tuple[str, float, float]] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def load(self, rows, version: int) -> bool:
+        """
+        用数据库中的 (id, name, longitude, latitude) 行重建索引。
+        version 为查询前读取的版本号，查询期间索引有变更时放弃本次加载并返回 False。
+        """
+        with self._lock:
+            if version != self._version:
+                return False
+            self._set_base(
+                [row[0] for row in rows],
+                [row[1] for row in rows],
+                [(row[2], row[3]) for row in rows],
+            )
+            self._loaded = True
+            self.rebuilds += 1
+            return True
+
+    def _rebuild(self):
+        """把待合并的变更并入 KD 树"""
+        keep = [k for k, i in enumerate(self._ids) if int(i) not in self._removed]
+        pending = list(self._pending.items())
+        self._set_base(
+            [int(self._ids[k]) for k in keep] + [i for i, _ in pending],
+            [self._names[k] for k in keep] + [p[0] for _, p in pending],
+            np.vstack(
+                [
+                    self._lonlat[keep],
+                    np.array([p[1:] for _, p in pending]).reshape(-1, 2),
+                ]
+            ),
+        )
+        self.rebuilds += 1
+
+    def _utm_tree(self, utm_epsg: int) -> Tuple[np.ndarray, np.ndarray, cKDTree | None]:
+        """在指定分带下投影已建索引的建筑点并建 KD 树，调用方需持有锁"""
+        entry = self._utm_trees.get(utm_epsg)
+        if entry is None:
+            easting, northing = get_geo_transformer(utm_epsg).wgs84_to_utm_array(
+                self._lonlat[:, 0], self._lonlat[:, 1]
+            )
+            utm = np.column_stack([easting, northing])
+            # 远离该分带的点可能无法投影，不参与该分带的查询
+            valid = np.flatnonzero(np.isfinite(utm).all(axis=1))
+            tree = cKDTree(utm[valid]) if len(valid) else None
+            entry = (utm, valid, tree)
+            self._utm_trees[utm_epsg] = entry
+        return entry
+
+    def _transformer_for(
+        self, longitude: float, latitude: float
+    ) -> GeoCoordTransformer:
+        if self.utm_epsg is not None:
+            return get_geo_transformer(self.utm_epsg)
+        return geo_transformer_for_location(longitude, latitude)
+
+    def _maybe_rebuild(self):
+        if len(self._pending) + len(self._removed) > self.rebuild_threshold:
+            self._rebuild()
+
+    def invalidate(self):
+        """整体失效，下次查询时从数据库重新加载"""
+        with self._lock:
+            self._loaded = False
+            self._version += 1
+
+    def upsert(self, point_id: int, name: str, longitude: float, latitude: float):
+        """新增或修改建筑点"""
+        with self._lock:
+            self._version += 1
+            if not self._loaded:
+                return
+            if point_id in self._position:
+                self._removed.add(point_id)
+            self._pending[point_id] = (name, longitude, latitude)
+            self._maybe_rebuild()
+
+    def remove(self, point_id: int):
+        """删除建筑点"""
+        with self._lock:
+            self._version += 1
+            if not self._loaded:
+                return
+            if point_id in self._position:
+                self._removed.add(point_id)
+            self._pending.pop(point_id, None)
+            self._maybe_rebuild()
+
+    def _row(
+        self, point_id: int, name: str, longitude: float, latitude: float
+    ) -> Dict[str, Any]:
+        return {
+            "id": point_id,
+            "name": name,
+            "latitude": latitude,
+            "longitude": longitude,
+        }
+
+    def within_bbox(
+        self,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+    ) -> List[Dict[str, Any]]:
+        """查询经纬度外包框内的建筑点，按 id 排序"""
+        with self._lock:
+            results = []
+            if self._lonlat_tree is not None:
+                # 切比雪夫距离的球即外包框的外接正方形，再精确筛选
+                center = [(min_lon + max_lon) / 2, (min_lat + max_lat) / 2]
+                radius = max(max_lon - min_lon, max_lat - min_lat) / 2
+                candidates = np.asarray(
+                    self._lonlat_tree.query_ball_point(center, radius, p=np.inf),
+                    dtype=np.intp,
+                )
+                lonlat = self._lonlat[candidates]
+                inside = candidates[
+                    (lonlat[:, 0] >= min_lon)
+                    & (lonlat[:, 0] <= max_lon)
+                    & (lonlat[:, 1] >= min_lat)
+                    & (lonlat[:, 1] <= max_lat)
+                ]
+                for k in inside:
+                    point_id = int(self._ids[k])
+                    if point_id not in self._removed:
+                        lon, lat = self._lonlat[k]
+                        results.append(
+                            self._row(point_id, self._names[k], float(lon), float(lat))
+                        )
+            for point_id, (name, lon, lat) in self._pending.items():
+                if min_lon <= lon <= max_lon and min_lat <= lat <= max_lat:
+                    results.append(self._row(point_id, name, lon, lat))
+        results.sort(key=lambda row: row["id"])
+        return results
+
+    def near(
+        self, longitude: float, latitude: float, radius: float
+    ) -> List[Dict[str, Any]]:
+        """
+        查询距离 (longitude, latitude) 不超过 radius 米的建筑点，按距离排序。
+        距离在查询点所在（或配置的）UTM 分带中计算。
+        """
+        transformer = self._transformer_for(longitude, latitude)
+        center = np.array(transformer.wgs84_to_utm(longitude, latitude))
+        with self._lock:
+            results = []
+            utm, valid, tree = self._utm_tree(transformer.utm_epsg)
+            if tree is not None:
+                for j in tree.query_ball_point(center, radius):
+                    k = valid[j]
+                    point_id = int(self._ids[k])
+                    if point_id not in self._removed:
+                        lon, lat = self._lonlat[k]
+                        row = self._row(
+                            point_id, self._names[k], float(lon), float(lat)
+                        )
+                        row["distance"] = float(np.linalg.norm(utm[k] - center))
+                        results.append(row)
+            for point_id, (name, lon, lat) in self._pending.items():
+                easting, northing = transformer.wgs84_to_utm(lon, lat)
+                distance = float(np.hypot(easting - center[0], northing - center[1]))
+                if distance <= radius:
+                    row = self._row(point_id, name, lon, lat)
+                    row["distance"] = distance
+                    results.append(row)
+        results.sort(key=lambda row: (row["distance"], row["id"]))
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": self._loaded,
+                "indexed": len(self._ids) - len(self._removed),
+                "pending": len(self._pending),
+                "removed": len(self._removed),
+                "rebuilds": self.rebuilds,
+                "utm_zones": sorted(self._utm_trees),
+            }
+
+
+building_point_index = BuildingPointIndex(
+    utm_epsg=CONFIG.UTM_EPSG,
+    rebuild_threshold=CONFIG.SPATIAL_INDEX_REBUILD_THRESHOLD,
+)
+
+
+async def load_building_point_index():
+    """
+    索引未加载或已失效时从数据库加载建筑点。
+    每次尝试使用新的会话，保证重试时读到的是最新数据而不是旧事务的快照。
+    """
+    while not building_point_index.loaded:
+        version = building_point_index.version
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(
+                    BuildingPointModel.id,
+                    BuildingPointModel.name,
+                    BuildingPointModel.longitude,
+                    BuildingPointModel.latitude,
+                )
+            )
+            rows = result.all()
+        building_point_index.load(rows, version)
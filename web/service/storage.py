@@ -0,0 +1,64 @@
+import hashlib
+import os
+import uuid
+
+from pathlib import Path
+from typing import Tuple
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+# 静态文件目录
+STATIC_DIR = Path(__file__).parent.parent / "static"
+
+# 创建上传目录
+UPLOAD_DIR = STATIC_DIR / "uploaded_images"
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def uploaded_image_file(image_path: str) -> Path:
+    """根据数据库中保存的相对路径获取上传图片在磁盘上的位置"""
+    return UPLOAD_DIR / Path(image_path).name
+
+
+class UploadTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
+
+def _write_chunk(buffer, digest, chunk: bytes):
+    digest.update(chunk)
+    buffer.write(chunk)
+
+
+async def save_upload_to_temp(
+    upload: UploadFile, max_size: int, chunk_size: int = 1024 * 1024
+) -> Tuple[Path, str, int]:
+    """
+    分块将上传文件写入 UPLOAD_DIR 下的临时文件，同时计算 SHA-256。
+    临时文件与目标目录在同一文件系统，之后可以用 os.replace 原子地移动。
+
+    :return: (临时文件路径, SHA-256 十六进制摘要, 文件大小)
+    """
+    tmp_file = UPLOAD_DIR / f".upload-{uuid.uuid4()}.tmp"
+    digest = hashlib.sha256()
+    size = 0
+    # 文件写入和哈希计算放到线程池中执行，大文件上传时不阻塞事件循环
+    buffer = await run_in_threadpool(open, tmp_file, "wb")
+    try:
+        try:
+            while chunk := await upload.read(chunk_size):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(f"文件大小超过限制 {max_size} 字节")
+                await run_in_threadpool(_write_chunk, buffer, digest, chunk)
+        finally:
+            await run_in_threadpool(buffer.close)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+    return tmp_file, digest.hexdigest(), size
+
+
+def derived_file(image_path: str, suffix: str) -> Path:
+    """获取与上传图片同目录的派生文件路径，例如 <图片名>.world.npy"""
+    return UPLOAD_DIR / f"{Path(image_path).stem}{suffix}"
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import uuid
+
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+import trimesh
+
+from service.recycle.schema import DEMData
+from service.recycle.terrain import build_terrain_mesh
+from service.storage import UPLOAD_DIR, derived_file
+
+# 地形网格缓存文件：<图片名>.terrain.<缓存键>.<格式>
+MESH_SUFFIX = ".terrain"
+MESH_FORMATS = {
+    "stl": "model/stl",
+    "glb": "model/gltf-binary",
+    "ply": "application/ply",
+}
+MAX_DECIMATION = 6
+# 重建流程变化时修改版本号，使旧的缓存失效
+MESH_VERSION = 2
+
+
+def boundary_lonlat(collection: Dict[str, Any]) -> np.ndarray:
+    """取出 GeoJSON 边界中所有多边形顶点的经纬度 (N, 2)"""
+    coords = [
+        vertex[:2]
+        for feature in collection.get("features", [])
+        for polygon in feature["geometry"]["coordinates"]
+        for ring in polygon
+        for vertex in ring
+    ]
+    return np.array(coords, dtype=np.float64).reshape(-1, 2)
+
+
+def terrain_mesh_key(
+    collection: Dict[str, Any], dem_file_path: str | Path, dem: DEMData, decimation: int
+) -> str:
+    """根据边界、DEM 文件和抽稀级别计算网格缓存键，与输出格式无关"""
+    dem_file = Path(dem_file_path).resolve()
+    digest = hashlib.sha1()
+    digest.update(boundary_lonlat(collection).tobytes())
+    digest.update(
+        json.dumps(
+            [
+                MESH_VERSION,
+                str(dem_file),
+                os.stat(dem_file).st_mtime_ns,
+                dem.utm_epsg,
+                decimation,
+            ]
+        ).encode("utf-8")
+    )
+    return digest.hexdigest()[:16]
+
+
+def terrain_mesh_file(image_path: str, key: str, file_format: str) -> Path:
+    return derived_file(image_path, f"{MESH_SUFFIX}.{key}.{file_format}")
+
+
+def get_terrain_mesh(
+    image_path: str,
+    collection: Dict[str, Any],
+    dem_file_path: str | Path,
+    dem: DEMData,
+    file_format: str = "stl",
+    decimation: int = 0,
+) -> Path:
+    """
+    获取图片的地形网格文件，缓存中不存在时重建并导出。
+
+    decimation 为抽稀级别，级别 n 表示每隔 2**n 个 DEM 格点取一个点。
+    """
+    key = terrain_mesh_key(collection, dem_file_path, dem, decimation)
+    mesh_file = terrain_mesh_file(image_path, key, file_format)
+    if mesh_file.exists():
+        return mesh_file
+
+    vertices, faces, normals = build_terrain_mesh(
+        dem, boundary_lonlat(collection), stride=2**decimation
+    )
+    mesh = trimesh.Trimesh(
+        vertices=vertices, faces=faces, vertex_normals=normals, process=False
+    )
+
+    # 先写临时文件再替换，避免并发请求读到写了一半的文件
+    tmp_file = mesh_file.with_name(f"{mesh_file.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_file, "wb") as f:
+        mesh.export(f, file_type=file_format)
+    os.replace(tmp_file, mesh_file)
+    return mesh_file
+
+
+def remove_terrain_meshes(image_path: str):
+    """删除图片所有缓存的地形网格"""
+    for mesh_file in UPLOAD_DIR.glob(f"{Path(image_path).stem}{MESH_SUFFIX}.*"):
+        try:
+            os.remove(mesh_file)
+        except FileNotFoundError:
+            pass
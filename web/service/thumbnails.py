@@ -0,0 +1,74 @@
+import hashlib
+import os
+import uuid
+
+from pathlib import Path
+
+import cv2
+
+from service.storage import STATIC_DIR, uploaded_image_file
+
+# 缩略图按图片内容哈希命名，内容相同的图片共用同一组缩略图
+THUMBNAIL_DIR = STATIC_DIR / "thumbnails"
+THUMBNAIL_DIR.mkdir(parents=True, exist_ok=True)
+THUMBNAIL_URL_PREFIX = "/static/thumbnails"
+
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def thumbnail_name(sha256: str, size: int) -> str:
+    return f"{sha256}_{size}.jpg"
+
+
+def thumbnail_file(sha256: str, size: int) -> Path:
+    return THUMBNAIL_DIR / thumbnail_name(sha256, size)
+
+
+def thumbnail_url(sha256: str, size: int) -> str:
+    return f"{THUMBNAIL_URL_PREFIX}/{thumbnail_name(sha256, size)}"
+
+
+def remove_thumbnails(sha256: str):
+    """删除指定内容哈希的所有尺寸缩略图"""
+    for path in THUMBNAIL_DIR.glob(f"{sha256}_*.jpg"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def build_thumbnail(image_path: str, sha256: str, size: int, quality: int = 80) -> Path:
+    """
+    生成最长边不超过 size 的 JPEG 缩略图，已存在时直接返回。
+    先写临时文件再替换，避免并发请求读到写了一半的文件。
+    """
+    target = thumbnail_file(sha256, size)
+    if target.exists():
+        return target
+
+    image = cv2.imread(str(uploaded_image_file(image_path)), cv2.IMREAD_COLOR)
+    if image is None:
+        raise RuntimeError(f"无法读取图片: {image_path}")
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1:
+        image = cv2.resize(
+            image,
+            (max(round(width * scale), 1), max(round(height * scale), 1)),
+            interpolation=cv2.INTER_AREA,
+        )
+
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError(f"无法生成缩略图: {image_path}")
+    tmp_file = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+    tmp_file.write_bytes(buffer.tobytes())
+    os.replace(tmp_file, target)
+    return target
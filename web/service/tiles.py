@@ -0,0 +1,162 @@
+import json
+import math
+import os
+import shutil
+import uuid
+
+from pathlib import Path
+from typing import Any, Dict
+
+import cv2
+
+from config import CONFIG
+from database import SessionLocal
+from model.images import Images as ImagesModel
+from service.jobs import JobReporter
+from service.storage import derived_file, uploaded_image_file
+
+# Deep Zoom 瓦片金字塔：<图片名>_tiles/<层级>/<列>_<行>.<格式>，元数据写在 <图片名>.tiles.json
+TILES_SUFFIX = "_tiles"
+META_SUFFIX = ".tiles.json"
+TILE_FORMATS = {"jpeg": ("jpg", "image/jpeg"), "webp": ("webp", "image/webp")}
+
+
+def tiles_dir(image_path: str) -> Path:
+    return derived_file(image_path, TILES_SUFFIX)
+
+
+def tile_file(image_path: str, level: int, col: int, row: int, extension: str) -> Path:
+    return tiles_dir(image_path) / str(level) / f"{col}_{row}.{extension}"
+
+
+def load_pyramid_meta(image_path: str) -> Dict[str, Any] | None:
+    """读取瓦片金字塔元数据，金字塔未生成完成时返回 None"""
+    try:
+        return json.loads(
+            derived_file(image_path, META_SUFFIX).read_text(encoding="utf-8")
+        )
+    except FileNotFoundError:
+        return None
+
+
+def remove_tile_pyramid(image_path: str):
+    """删除图片的瓦片金字塔"""
+    try:
+        os.remove(derived_file(image_path, META_SUFFIX))
+    except FileNotFoundError:
+        pass
+    shutil.rmtree(tiles_dir(image_path), ignore_errors=True)
+
+
+def _write_level(image, level_dir: Path, tile_size: int, overlap: int, extension, params):
+    """按 Deep Zoom 规则切分一个层级，相邻瓦片各自向外扩展 overlap 像素"""
+    level_dir.mkdir(parents=True, exist_ok=True)
+    height, width = image.shape[:2]
+    for row in range(math.ceil(height / tile_size)):
+        y0 = max(row * tile_size - overlap, 0)
+        y1 = min((row + 1) * tile_size + overlap, height)
+        for col in range(math.ceil(width / tile_size)):
+            x0 = max(col * tile_size - overlap, 0)
+            x1 = min((col + 1) * tile_size + overlap, width)
+            cv2.imwrite(
+                str(level_dir / f"{col}_{row}.{extension}"),
+                image[y0:y1, x0:x1],
+                params,
+            )
+
+
+def build_tile_pyramid(
+    image_path: str,
+    tile_size: int = 256,
+    overlap: int = 1,
+    tile_format: str = "jpeg",
+    quality: int = 85,
+    report: JobReporter | None = None,
+) -> Dict[str, Any]:
+    """
+    使用 OpenCV 生成 Deep Zoom 布局的瓦片金字塔。
+
+    最高层级为原图分辨率，每往下一级长宽减半（向上取整），第 0 级为 1x1 像素。
+    先写入临时目录，全部完成后再替换正式目录并写入元数据。
+    生成期间图片可能已被删除，发布前后都检查原图是否还在，避免留下孤立的金字塔。
+    """
+    extension, _ = TILE_FORMATS[tile_format]
+    if tile_format == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+
+    image = cv2.imread(str(uploaded_image_file(image_path)), cv2.IMREAD_COLOR)
+    if image is None:
+        raise RuntimeError(f"无法读取图片: {image_path}")
+    height, width = image.shape[:2]
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+
+    target_dir = tiles_dir(image_path)
+    tmp_dir = target_dir.with_name(f"{target_dir.name}.{uuid.uuid4().hex}.tmp")
+
+    for level in range(max_level, -1, -1):
+        _write_level(image, tmp_dir / str(level), tile_size, overlap, extension, params)
+        if report is not None:
+            progress = 0.05 + 0.9 * (max_level - level + 1) / (max_level + 1)
+            report(progress, f"已生成第 {level} 级瓦片")
+        if level > 0:
+            h, w = image.shape[:2]
+            image = cv2.resize(
+                image,
+                (max(math.ceil(w / 2), 1), max(math.ceil(h / 2), 1)),
+                interpolation=cv2.INTER_AREA,
+            )
+
+    source_file = uploaded_image_file(image_path)
+    if not source_file.exists():
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise RuntimeError(f"图片已被删除，放弃发布瓦片: {image_path}")
+
+    remove_tile_pyramid(image_path)
+    os.replace(tmp_dir, target_dir)
+
+    meta = {
+        "layout": "deepzoom",
+        "width": width,
+        "height": height,
+        "tile_size": tile_size,
+        "overlap": overlap,
+        "format": tile_format,
+        "extension": extension,
+        "min_level": 0,
+        "max_level": max_level,
+    }
+    meta_file = derived_file(image_path, META_SUFFIX)
+    tmp_meta = meta_file.with_name(f"{meta_file.name}.{uuid.uuid4().hex}.tmp")
+    tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+    os.replace(tmp_meta, meta_file)
+
+    # 删除接口先删原图再删金字塔，发布后原图不在说明删除已在发布前后完成，需要自行清理
+    if not source_file.exists():
+        remove_tile_pyramid(image_path)
+        raise RuntimeError(f"图片已被删除，放弃发布瓦片: {image_path}")
+    return meta
+
+
+def build_tile_pyramid_job(report: JobReporter, image_id: int) -> Dict[str, Any]:
+    """后台任务：图片上传后生成瓦片金字塔"""
+    db = SessionLocal()
+    try:
+        image = db.query(ImagesModel).filter(ImagesModel.id == image_id).first()
+        if not image:
+            raise RuntimeError("图片不存在")
+        image_path = image.path
+    finally:
+        db.close()
+
+    report(0.05, "读取图片")
+    meta = build_tile_pyramid(
+        image_path,
+        tile_size=CONFIG.TILE_SIZE,
+        overlap=CONFIG.TILE_OVERLAP,
+        tile_format=CONFIG.TILE_FORMAT,
+        quality=CONFIG.TILE_QUALITY,
+        report=report,
+    )
+    return {"image_id": image_id, **meta}
@@ -0,0 +1,161 @@
+import json
+import math
+import os
+import uuid
+
+from typing import Any, Dict, Tuple
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from service.boundaries import STEP_SCHEDULE
+from service.camera_context import CameraContext
+from service.jobs import JobReporter
+from service.recycle.schema import DEMData
+from service.recycle.utils import pixels_to_geo_with_factors
+from service.storage import derived_file, uploaded_image_file
+
+# 像素→地理坐标查找栅格，与上传图片保存在同一目录
+RASTER_SUFFIX = ".world.npy"
+META_SUFFIX = ".world.json"
+
+# EXIF 中图片方向的标签
+EXIF_ORIENTATION = 0x0112
+
+
+def remove_world_raster(image_path: str):
+    """删除图片的查找栅格（特征点或相机参数变化后栅格失效）"""
+    for suffix in (RASTER_SUFFIX, META_SUFFIX):
+        try:
+            os.remove(derived_file(image_path, suffix))
+        except FileNotFoundError:
+            pass
+
+
+def _raster_identity(context: CameraContext) -> Dict[str, Any]:
+    """查找栅格对应的特征点、相机参数和 DEM，任意一项变化时栅格失效"""
+    return {
+        "feature_hash": context.feature_hash,
+        "camera_param_id": context.camera_param_id,
+        "camera_version": context.camera_version,
+        "dem_identity": (
+            list(context.dem_identity) if context.dem_identity is not None else None
+        ),
+    }
+
+
+def image_size(image_path: str) -> Tuple[int, int]:
+    """
+    只读取图片文件头获取 (宽, 高)，不解码像素数据。
+    与 cv2.imread 一致按 EXIF 方向校正，旋转 90° 的图片交换宽高。
+    """
+    try:
+        with Image.open(uploaded_image_file(image_path)) as image:
+            width, height = image.size
+            if image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+                width, height = height, width
+    except (OSError, UnidentifiedImageError):
+        raise RuntimeError(f"无法读取图片: {image_path}")
+    return width, height
+
+
+def build_world_raster(
+    context: CameraContext,
+    dem: DEMData,
+    stride: int,
+    report: JobReporter | None = None,
+) -> Dict[str, Any]:
+    """
+    按 stride 间隔对图片像素做射线求交，生成 (rows, cols, 3) 的 UTM (E, N, h) 查找栅格。
+    栅格第 (i, j) 个元素对应像素 (j * stride, i * stride)，没有交点的位置为 NaN。
+    """
+    image_path = context.image_path
+    width, height = image_size(image_path)
+
+    cols = math.ceil((width - 1) / stride) + 1
+    rows = math.ceil((height - 1) / stride) + 1
+    xs = np.arange(cols, dtype=np.float64) * stride
+    ys = np.arange(rows, dtype=np.float64) * stride
+
+    raster = np.full((rows, cols, 3), np.nan, dtype=np.float64)
+    # 按行分批计算，便于上报进度
+    batch_rows = max(1, 65536 // cols)
+    for start in range(0, rows, batch_rows):
+        end = min(start + batch_rows, rows)
+        grid_x, grid_y = np.meshgrid(xs, ys[start:end])
+        points, _ = pixels_to_geo_with_factors(
+            np.column_stack([grid_x.ravel(), grid_y.ravel()]),
+            context.K,
+            context.R,
+            context.ray_origin,
+            dem,
+            context.control_pixels,
+            context.optimization_factors,
+            step_schedule=STEP_SCHEDULE,
+        )
+        raster[start:end] = points.reshape(end - start, cols, 3)
+        if report is not None:
+            report(0.1 + 0.85 * end / rows, f"已计算 {end}/{rows} 行")
+
+    raster_file = derived_file(image_path, RASTER_SUFFIX)
+    meta_file = derived_file(image_path, META_SUFFIX)
+    meta = {
+        "stride": stride,
+        "width": width,
+        "height": height,
+        "utm_epsg": dem.utm_epsg,
+        **_raster_identity(context),
+    }
+
+    # 先写临时文件再替换，避免查询时读到写了一半的栅格
+    tmp_raster = raster_file.with_name(f"{raster_file.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_raster, "wb") as f:
+        np.save(f, raster)
+    tmp_meta = meta_file.with_name(f"{meta_file.name}.{uuid.uuid4().hex}.tmp")
+    tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+    os.replace(tmp_raster, raster_file)
+    os.replace(tmp_meta, meta_file)
+
+    return {**meta, "coverage": float(np.mean(~np.isnan(raster[..., 0])))}
+
+
+def lookup_world_raster(
+    context: CameraContext, pixels: np.ndarray
+) -> np.ndarray | None:
+    """
+    在查找栅格中双线性插值像素对应的 UTM 坐标，返回 (N, 3)。
+    栅格不存在或已失效时返回 None；插值邻域内存在无交点格点的像素返回 NaN。
+    """
+    raster_file = derived_file(context.image_path, RASTER_SUFFIX)
+    meta_file = derived_file(context.image_path, META_SUFFIX)
+    try:
+        meta = json.loads(meta_file.read_text(encoding="utf-8"))
+        raster = np.load(raster_file, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if any(meta.get(key) != value for key, value in _raster_identity(context).items()):
+        return None
+
+    pixels = np.asarray(pixels, dtype=np.float64).reshape(-1, 2)
+    rows, cols = raster.shape[:2]
+    gx = pixels[:, 0] / meta["stride"]
+    gy = pixels[:, 1] / meta["stride"]
+    inside = (gx >= 0) & (gx <= cols - 1) & (gy >= 0) & (gy <= rows - 1)
+
+    result = np.full((len(pixels), 3), np.nan)
+    if not inside.any():
+        return result
+
+    gx = gx[inside]
+    gy = gy[inside]
+    c0 = np.minimum(np.floor(gx).astype(np.intp), max(cols - 2, 0))
+    r0 = np.minimum(np.floor(gy).astype(np.intp), max(rows - 2, 0))
+    c1 = np.minimum(c0 + 1, cols - 1)
+    r1 = np.minimum(r0 + 1, rows - 1)
+    fx = (gx - c0)[:, None]
+    fy = (gy - r0)[:, None]
+
+    top = raster[r0, c0] * (1 - fx) + raster[r0, c1] * fx
+    bottom = raster[r1, c0] * (1 - fx) + raster[r1, c1] * fx
+    result[inside] = top * (1 - fy) + bottom * fy
+    return result
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+from pathlib import Path
+
+# 测试使用独立的临时 SQLite 数据库，需在导入 config 之前设置
+os.environ["DATABASE_URI"] = "sqlite:///" + os.path.join(
+    tempfile.mkdtemp(prefix="hisr-test-"), "test.db"
+)
+os.environ.setdefault("DEM_PRELOAD", "false")
+
+# 应用以 web 目录为根导入模块（from config import CONFIG）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,89 @@
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import create_app
+from database import SessionLocal, async_engine, engine
+from model.building_point import BuildingPoint
+from model.feature import Feature
+from model.images import Images
+from service.recycle.utils import load_features_from_orm
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(create_app())
+
+
+@contextmanager
+def count_statements(target):
+    """统计 with 块内在引擎上执行的 SQL 语句数量"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+
+def create_image_with_features(count: int) -> int:
+    """创建一张带 count 个特征点的图片，每个特征点对应不同的建筑点"""
+    db = SessionLocal()
+    try:
+        image = Images(name=f"{count}.jpg", path=f"/static/uploaded_images/{count}.jpg")
+        points = [
+            BuildingPoint(name=f"P{i}", longitude=116.4 + i * 1e-3, latitude=39.9)
+            for i in range(count)
+        ]
+        db.add(image)
+        db.add_all(points)
+        db.flush()
+        db.add_all(
+            Feature(
+                pixel_x=10 * i,
+                pixel_y=20 * i,
+                image_id=image.id,
+                building_point_id=point.id,
+            )
+            for i, point in enumerate(points)
+        )
+        db.commit()
+        return image.id
+    finally:
+        db.close()
+
+
+def test_load_features_from_orm_statement_count_is_constant(client):
+    counts = {}
+    for n in (2, 8):
+        image_id = create_image_with_features(n)
+        db = SessionLocal()
+        try:
+            with count_statements(engine) as statements:
+                features = load_features_from_orm(image_id, db)
+        finally:
+            db.close()
+        assert len(features) == n
+        assert all(feature.name and feature.longitude for feature in features)
+        counts[n] = len(statements)
+
+    assert counts[2] == counts[8]
+
+
+def test_image_features_endpoint_statement_count_is_constant(client):
+    counts = {}
+    for n in (2, 8):
+        image_id = create_image_with_features(n)
+        with count_statements(async_engine.sync_engine) as statements:
+            response = client.get(f"/api/images/{image_id}/features")
+        assert response.status_code == 200
+        assert len(response.json()) == n
+        counts[n] = len(statements)
+
+    assert counts[2] == counts[8]